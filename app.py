@@ -1,154 +1,111 @@
-from flask import Flask, request, abort
+from flask import Flask, Response, abort, request, send_file, stream_with_context
 from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage
-import traceback
+import atexit
+import json
 import os
-import re
-from sheet_utils import (
-    create_group, get_group_members, append_group_record, split_group_expense,
-    top_up_group_fund, format_group_fund_history,
-    delete_group_meal, reset_group_records,
-    format_group_fund_balance, suggest_group_fund_topup
-)
+from urllib.parse import quote
+import metrics
+from event_dedup import MemoryDedupStore, SQLiteDedupStore, WebhookDeduplicator
+from event_queue import OrderedWorkerPool
+from export_utils import EXPORT_KINDS, build_xlsx_file, iter_csv, verify_export
+from utils import split_message
+from commands import command_name, order_key, process_command
 
 app = Flask(__name__)
 
 line_bot_api = LineBotApi(os.getenv("LINE_CHANNEL_ACCESS_TOKEN"))
 handler = WebhookHandler(os.getenv("LINE_CHANNEL_SECRET"))
 
-HELP_MESSAGE = """
-📌 團體記帳指令總覽
-
-1. 🏗️ 建立團體記帳
-建立團體記帳 [團名] [成員1] [成員2] ...
-例：建立團體記帳 大阪 寧 誌 小白
-
-2. 🍱 分帳
-分帳 [團名] [餐別] [總金額] [人名+/-調整金額...]
-例：分帳 大阪 早餐 2300 寧+300
-
-3. 📊 查詢團體記帳
-查詢團體記帳 [團名]
-
-4. 💰 儲值公費
-儲值公費 [團名] [總金額]
-儲值公費 [團名] 小明+300 小花+200
-例：儲值公費 大阪 3000
-例：儲值公費 大阪 小明+500 小花+200
-
-5. 📜 查詢公費紀錄
-查詢公費紀錄 [團名]
-
-6. ❌ 刪除餐別
-刪除餐別 [團名] [日期] [餐別]
-例：刪除餐別 大阪 2024/06/03 早餐
-
-7. 🔄 重設團體記帳
-重設團體記帳 [團名]
-"""
+# 非同步模式：驗證簽章後立即回 200 給 LINE，指令交給背景 worker 處理
+ASYNC_WEBHOOK = os.getenv("ASYNC_WEBHOOK") == "1"
+event_pool = None
+if ASYNC_WEBHOOK:
+    event_pool = OrderedWorkerPool(
+        workers=int(os.getenv("WEBHOOK_WORKERS", "4")),
+        max_queue=int(os.getenv("WEBHOOK_QUEUE_SIZE", "100")),
+    )
+    atexit.register(event_pool.shutdown)
+    metrics.register_collector(lambda: [
+        ("linebot_event_queue", "gauge", {"stat": k}, v) for k, v in event_pool.metrics().items()
+    ])
+
+# 重送事件去重：WEBHOOK_DEDUP_BACKEND=memory（預設，單一行程）或 sqlite（同一台機器的多個 worker 共用）
+WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))  # 秒
+WEBHOOK_DEDUP_MAX = int(os.getenv("WEBHOOK_DEDUP_MAX", "10000"))
+if os.getenv("WEBHOOK_DEDUP_BACKEND") == "sqlite":
+    dedup_store = SQLiteDedupStore(os.getenv("WEBHOOK_DEDUP_PATH", "webhook_dedup.db"),
+                                   WEBHOOK_DEDUP_TTL, WEBHOOK_DEDUP_MAX)
+else:
+    dedup_store = MemoryDedupStore(WEBHOOK_DEDUP_TTL, WEBHOOK_DEDUP_MAX)
+deduplicator = WebhookDeduplicator(dedup_store)
+metrics.register_collector(lambda: [
+    ("linebot_webhook_events_total", "counter", {"stat": k}, v) for k, v in deduplicator.stats.items()
+])
 
 @app.route("/callback", methods=['POST'])
 def callback():
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
+    if not handler.parser.signature_validator.validate(body, signature):
         abort(400)
-    return 'OK'
-
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    text = event.message.text.strip()
-
-    if text == "/help":
-        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=HELP_MESSAGE))
-        return
-
-    try:
-        if text.startswith("建立團體記帳"):
-            args = text.split()
-            if len(args) < 3:
-                result = "❗請提供團名與至少一位成員，例如：建立團體記帳 大阪 寧 誌"
-            else:
-                group_name = args[1]
-                members = args[2:]
-                result = create_group(group_name, members)
-                if result:
-                    result = f"✅ 已建立團體：{group_name}"
-                else:
-                    result = f"⚠️ 團體 {group_name} 已存在"
-
-        elif text.startswith("分帳"):
-            pattern = r"分帳 (\S+) (\S+) (\d+)(.*)"
-            match = re.match(pattern, text)
-            if match:
-                group_name = match.group(1)
-                meal_name = match.group(2)
-                total_amount = int(match.group(3))
-                raw_adjustments = match.group(4).strip()
-                adjustments = raw_adjustments.split() if raw_adjustments else []
-                result = split_group_expense(group_name, meal_name, total_amount, adjustments)
-            else:
-                result = "❗格式錯誤，請參考：分帳 [團名] [餐別] [總金額] [人名+/-調整金額...]"
-
-        elif text.startswith("查詢團體記帳"):
-            parts = text.split()
-            if len(parts) < 2:
-                result = "❗請提供團名，例如：查詢團體記帳 大阪"
-            else:
-                from sheet_utils import get_group_records  # 延遲導入避免循環引用
-                group_name = parts[1]
-                result = get_group_records(group_name)
-
-        elif text.startswith("儲值公費"):
-            parts = text.split()
-            if len(parts) < 2:
-                result = "❗請提供團名，例如：儲值公費 大阪 3000"
-            else:
-                group_name = parts[1]
-                if len(parts) == 3 and parts[2].isdigit():
-                    amount = int(parts[2])
-                    result = top_up_group_fund(group_name, amount)
-                elif len(parts) > 2:
-                    contributions = parts[2:]
-                    result = top_up_group_fund(group_name, contributions=contributions)
-                else:
-                    result = "❗請提供總金額或個人儲值明細"
-
-        elif text.startswith("查詢公費紀錄"):
-            parts = text.split()
-            if len(parts) < 2:
-                result = "❗請提供團名，例如：查詢公費紀錄 大阪"
-            else:
-                group_name = parts[1]
-                result = format_group_fund_history(group_name)
-
-        elif text.startswith("刪除餐別"):
-            parts = text.split()
-            if len(parts) != 4:
-                result = "❗請提供格式：刪除餐別 [團名] [日期] [餐別]"
-            else:
-                _, group_name, date_str, meal_name = parts
-                result = delete_group_meal(group_name, date_str, meal_name)
-
-        elif text.startswith("重設團體記帳"):
-            parts = text.split()
-            if len(parts) < 2:
-                result = "❗請提供團名，例如：重設團體記帳 大阪"
-            else:
-                group_name = parts[1]
-                result = reset_group_records(group_name)
-
+    # 直接讀取原始 JSON：SDK 的事件物件不保留 webhookEventId 與 deliveryContext
+    for raw_event in json.loads(body).get("events", []):
+        if deduplicator.is_duplicate(raw_event):
+            continue
+        if raw_event.get("type") != "message":
+            continue
+        event = MessageEvent.new_from_json_dict(raw_event)
+        if not isinstance(event.message, TextMessage):
+            continue
+        if event_pool is None:
+            handle_message(event)
         else:
-            result = f"❓ 無法識別的指令，請參考以下指令：\n\n{HELP_MESSAGE}"
+            event_pool.submit(event_order_key(event), handle_message, event)
+    return 'OK'
 
-    except Exception as e:
-        print("⚠️ Error:", traceback.format_exc())
-        result = f"⚠️ 發生錯誤：{str(e)}"
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/export", methods=['GET'])
+def export_endpoint():
+    """
+    下載團體紀錄；網址由「匯出」指令產生，簽章錯誤或過期時回 403
+    """
+    group = request.args.get("group", "")
+    kind = request.args.get("kind", "xlsx")
+    if not verify_export(group, kind, request.args.get("expires"), request.args.get("sig")):
+        abort(403)
+    if EXPORT_KINDS[kind] == "csv":
+        filename = quote(f"{group}_{'餐別紀錄' if kind == 'meals' else '公費紀錄'}.csv")
+        return Response(stream_with_context(iter_csv(group, kind)), mimetype="text/csv",
+                        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"})
+    path = build_xlsx_file(group)
+    response = send_file(path, as_attachment=True, download_name=f"{group}.xlsx")
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+def event_order_key(event):
+    """
+    同一個團體的指令必須依序處理（例如兩筆分帳不可交錯），
+    以訊息中的團名為 key；沒有團名的指令則依聊天室排序。
+    """
+    key = order_key(event.message.text)
+    if key:
+        return key
+    source = event.source
+    return getattr(source, "group_id", None) or getattr(source, "room_id", None) or source.user_id
 
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=result))
+def handle_message(event):
+    text = event.message.text
+    with metrics.command_scope(command_name(text)):
+        result = process_command(event.source.user_id, text)
+        chunks = split_message(result)
+        messages = [TextSendMessage(text=chunk) for chunk in chunks]
+        reply_bytes = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+        with metrics.track("line_reply", "reply_message", bytes_out=reply_bytes):
+            line_bot_api.reply_message(event.reply_token, messages)
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,165 @@
+import bisect
+import threading
+
+# group_funds 分頁欄位順序：group_name, member, timestamp, amount, type, record_id
+# record_id 是寫入該列的指令的紀錄編號；分帳產生的扣款與餐別列的「紀錄編號」相同，舊資料為空白
+FUND_GROUP_COL = 0
+FUND_MEMBER_COL = 1
+FUND_TIME_COL = 2
+FUND_AMOUNT_COL = 3
+FUND_TYPE_COL = 4
+FUND_ID_COL = 5
+
+
+def row_checksum(row):
+    """
+    忽略結尾的空白儲存格：get_all_values 會補齊欄數，範圍讀取則不會
+    """
+    cells = [str(v).strip() for v in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return "\x1f".join(cells)
+
+
+def fund_record_id(row):
+    return str(row[FUND_ID_COL]).strip() if len(row) > FUND_ID_COL else ""
+
+
+def signed_amount(row):
+    """
+    儲值為正、扣款為負；金額無法解析的列視為 0
+    """
+    try:
+        amount = float(str(row[FUND_AMOUNT_COL]).replace(",", ""))
+    except (IndexError, ValueError):
+        return 0
+    if amount.is_integer():
+        amount = int(amount)
+    action = str(row[FUND_TYPE_COL]).strip() if len(row) > FUND_TYPE_COL else ""
+    return amount if action == "儲值" else -amount
+
+
+class BalanceIndex:
+    """
+    (團名, 成員) → 公費餘額 的索引，同時記錄每個團體在 group_funds 中的列號與時間，
+    讓查詢紀錄時只需讀取需要的列。
+    冷啟動時從 group_funds 全表建立一次，之後每次寫入公費列時就地更新；
+    查詢前只需比對索引記錄的最後一列與試算表是否一致（一次小範圍讀取），
+    不一致（例如有人手動編輯）才重新建立。
+    """
+
+    def __init__(self, normalize=str):
+        self._normalize = normalize
+        self._lock = threading.Lock()
+        self._balances = {}
+        self._rows = {}             # 團名 → [(列號, 時間, 成員, 類型, 紀錄編號), ...]
+        self.loaded = False
+        self.last_row = 0           # 已納入索引的最後一列列號（含標題列）
+        self.last_checksum = None
+        self.stats = {"rebuilds": 0, "incremental_rows": 0}
+
+    def rebuild(self, values):
+        """
+        values: get_all_values() 的結果，第一列為標題
+        """
+        balances = {}
+        rows = {}
+        for row_no, row in enumerate(values[1:], start=2):
+            if not row or not str(row[FUND_GROUP_COL]).strip():
+                continue
+            self._add(balances, rows, row_no, row)
+        with self._lock:
+            self._balances = balances
+            self._rows = rows
+            self.last_row = len(values)
+            self.last_checksum = row_checksum(values[-1]) if values else None
+            self.loaded = True
+            self.stats["rebuilds"] += 1
+
+    def apply(self, rows, row_range):
+        """
+        把剛寫入試算表的列套用到索引。row_range 是寫入的 (起始列, 結束列)，
+        若與索引的最後一列不連續，代表有其他寫入者，改為標記需要重建。
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            if not row_range or row_range[0] != self.last_row + 1:
+                self.loaded = False
+                return
+            for row_no, row in enumerate(rows, start=row_range[0]):
+                self._add(self._balances, self._rows, row_no, row)
+            self.last_row = row_range[1]
+            self.last_checksum = row_checksum(rows[-1])
+            self.stats["incremental_rows"] += len(rows)
+
+    def next_range(self, count):
+        """
+        接在索引最後一列之後寫入 count 列時的 (起始列, 結束列)；索引尚未建立時回傳 None
+        """
+        with self._lock:
+            if not self.loaded:
+                return None
+            return self.last_row + 1, self.last_row + count
+
+    def verify(self, tail):
+        """
+        tail: 試算表第 last_row 列之後的所有內容，只有一列且與索引的最後一列相同才一致
+        """
+        with self._lock:
+            return (self.loaded and len(tail) == 1
+                    and row_checksum(tail[0]) == self.last_checksum)
+
+    def remove(self, deleted):
+        """
+        deleted: {列號: 列內容}。刪除 group_funds 的列之後更新索引：扣回餘額，後面的列號往前移。
+        刪到最後一列時無法得知新的最後一列內容，改為標記需要重建。
+        """
+        removed = sorted(deleted)
+        with self._lock:
+            if not self.loaded:
+                return
+            if self.last_row in deleted:
+                self.loaded = False
+                return
+            for row in deleted.values():
+                group = self._balances.get(self._normalize(row[FUND_GROUP_COL]), {})
+                member = str(row[FUND_MEMBER_COL]).strip()
+                group[member] = group.get(member, 0) - signed_amount(row)
+            for key, entries in self._rows.items():
+                self._rows[key] = [(row_no - bisect.bisect_left(removed, row_no), *fields)
+                                   for row_no, *fields in entries if row_no not in deleted]
+            self.last_row -= len(removed)
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded = False
+
+    def balances(self, group_name):
+        with self._lock:
+            return dict(self._balances.get(self._normalize(group_name), {}))
+
+    def rows(self, group_name):
+        """
+        回傳該團體的 [(列號, 時間), ...]，依寫入順序排列
+        """
+        with self._lock:
+            return [(row_no, timestamp) for row_no, timestamp, *_ in self._rows.get(self._normalize(group_name), [])]
+
+    def deductions(self, group_name):
+        """
+        回傳該團體扣款列的 [(列號, 時間, 成員, 紀錄編號), ...]
+        """
+        with self._lock:
+            return [(row_no, timestamp, member, record_id)
+                    for row_no, timestamp, member, action, record_id in self._rows.get(self._normalize(group_name), [])
+                    if action != "儲值"]
+
+    def _add(self, balances, rows, row_no, row):
+        key = self._normalize(row[FUND_GROUP_COL])
+        group = balances.setdefault(key, {})
+        member = str(row[FUND_MEMBER_COL]).strip()
+        group[member] = group.get(member, 0) + signed_amount(row)
+        timestamp = str(row[FUND_TIME_COL]) if len(row) > FUND_TIME_COL else ""
+        action = str(row[FUND_TYPE_COL]).strip() if len(row) > FUND_TYPE_COL else ""
+        rows.setdefault(key, []).append((row_no, timestamp, member, action, fund_record_id(row)))
@@ -0,0 +1,68 @@
+"""
+發票解析器效能與準確度量測。
+用法：python benchmarks/bench_invoice_parser.py [語料筆數]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_parser import parse_invoice_text  # noqa: E402
+from invoice_corpus import build_corpus  # noqa: E402
+
+
+def legacy_parse_invoice_text(extracted_text):
+    """
+    舊版的三次 re.findall 解析，作為比較基準
+    """
+    invoice_number_matches = re.findall(r'\b[A-Z]{2}\d{8}\b', extracted_text)
+    amounts = re.findall(r'(\d+(?:,\d{3})*(?:\.\d{2})?)', extracted_text)
+    items = [{"name": m[0].strip(), "amount": float(m[1].replace(",", ""))}
+             for m in re.findall(r'(\D+?)\s+(\d+(?:,\d{3})*(?:\.\d{2})?)', extracted_text)]
+    return {
+        "invoice_number": invoice_number_matches[0] if invoice_number_matches else "",
+        "total": float(amounts[-1].replace(",", "")) if amounts else 0,
+        "items": items,
+    }
+
+
+def run(parser, corpus, repeat=3):
+    correct = {"invoice_number": 0, "total": 0, "items": 0}
+    for text, expected in corpus:
+        result = parser(text)
+        for field in correct:
+            if result[field] == expected[field]:
+                correct[field] += 1
+
+    total_bytes = sum(len(text.encode("utf-8")) for text, _ in corpus)
+    best = float("inf")
+    slowest = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text, _ in corpus:
+            doc_start = time.perf_counter()
+            parser(text)
+            slowest = max(slowest, time.perf_counter() - doc_start)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "docs_per_sec": len(corpus) / best,
+        "mb_per_sec": total_bytes / best / 1e6,
+        "slowest_ms": slowest * 1000,
+        "accuracy": {field: count / len(corpus) for field, count in correct.items()},
+    }
+
+
+def main(argv):
+    size = int(argv[1]) if len(argv) > 1 else 500
+    corpus = build_corpus(size)
+    for name, parser in (("invoice_parser", parse_invoice_text), ("legacy regex", legacy_parse_invoice_text)):
+        result = run(parser, corpus)
+        accuracy = "  ".join(f"{field} {value:.1%}" for field, value in result["accuracy"].items())
+        print(f"{name:15s} {result['docs_per_sec']:10.0f} docs/s  {result['mb_per_sec']:6.2f} MB/s"
+              f"  最慢單筆 {result['slowest_ms']:7.2f} ms  {accuracy}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
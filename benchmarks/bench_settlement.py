@@ -0,0 +1,52 @@
+"""
+結算效能量測：產生大量成員與公費／餐別紀錄，量測 settle() 的耗時。
+公費列先彙總成每人餘額（正式環境由餘額索引維護），只有餐別列逐列交給 settle()。
+用法：python benchmarks/bench_settlement.py [成員數] [紀錄筆數]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balance_index import signed_amount  # noqa: E402
+from settlement import distribute, settle  # noqa: E402
+
+
+def build_rows(member_count, row_count, seed=20240601):
+    rng = random.Random(seed)
+    members = [f"成員{i}" for i in range(member_count)]
+    fund_rows = []
+    meal_rows = []
+    while len(fund_rows) + len(meal_rows) < row_count:
+        kind = rng.random()
+        if kind < 0.1:
+            fund_rows.append(["大阪", rng.choice(members), "2024-06-01 12:00:00", rng.randrange(100, 5000), "儲值"])
+        else:
+            diners = rng.sample(members, min(len(members), rng.randrange(2, 12)))
+            total = rng.randrange(100, 8000)
+            payer = rng.choice(diners) if kind < 0.3 else "系統"
+            meal_rows.append(["2024-06-01 12:00", "晚餐", total, payer])
+            for name, share in distribute(total, diners).items():
+                fund_rows.append(["大阪", name, "2024-06-01 12:00:00", share, "deduct"])
+    return members, fund_rows, meal_rows
+
+
+def main(argv):
+    member_count = int(argv[1]) if len(argv) > 1 else 300
+    row_count = int(argv[2]) if len(argv) > 2 else 50000
+    members, fund_rows, meal_rows = build_rows(member_count, row_count)
+    fund_balances = {}
+    for row in fund_rows:
+        fund_balances[row[1]] = fund_balances.get(row[1], 0) + signed_amount(row)
+    settle({}, meal_rows[:1], members)  # 先載入 pandas，不計入量測
+    start = time.perf_counter()
+    balances, transfers = settle(fund_balances, meal_rows, members)
+    elapsed = time.perf_counter() - start
+    print(f"{len(members)} 位成員、{len(fund_rows) + len(meal_rows)} 筆紀錄："
+          f"{elapsed * 1000:.1f} ms，{len(transfers)} 筆轉帳")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,85 @@
+"""
+Sheets 配額限流在競爭下的表現：多個使用者指令執行緒與一個背景補寫執行緒同時對假伺服器寫入，
+比較不限流（429 直接失敗）與 QuotaLimiter 的成功率、延遲與背景工作量。
+配額視窗縮短為數秒以加快量測，比例與正式環境的每分鐘配額相同。
+用法：python benchmarks/bench_sheets_quota.py [指令執行緒數] [每執行緒請求數] [視窗秒數]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.support.fake_sheets import FakeSession, FakeSheetsServer  # noqa: E402
+from sheets_quota import BACKGROUND, QuotaLimiter, priority  # noqa: E402
+
+QUOTA = 60  # 每個視窗的寫入次數上限，與正式環境每分鐘 60 次相同
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run(threads, requests_per_thread, window, limited):
+    server = FakeSheetsServer(read_per_minute=QUOTA, write_per_minute=QUOTA, window=window, latency=0.005)
+    session = FakeSession(server)
+    if limited:
+        QuotaLimiter(QUOTA, QUOTA, window=window, backoff_base=window / 30, backoff_cap=window).install(session)
+
+    latencies = []
+    failures = [0]
+    background_done = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def interactive():
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            ok = session.request("POST", "/values:append").ok
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    failures[0] += 1
+
+    def background():
+        with priority(BACKGROUND):
+            while not stop.is_set():
+                if session.request("POST", "/values:append").ok:
+                    background_done[0] += 1
+                else:
+                    time.sleep(window / 30)
+
+    workers = [threading.Thread(target=interactive) for _ in range(threads)]
+    flusher = threading.Thread(target=background)
+    start = time.perf_counter()
+    flusher.start()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    flusher.join()
+
+    label = "QuotaLimiter" if limited else "不限流"
+    print(f"{label}：指令成功 {len(latencies)}／失敗 {failures[0]}，"
+          f"p50 {percentile(latencies, 0.5) * 1000:.0f} ms，p95 {percentile(latencies, 0.95) * 1000:.0f} ms，"
+          f"背景完成 {background_done[0]}，伺服器回 429 共 {server.stats['429']} 次，"
+          f"耗時 {elapsed:.1f} s（{len(latencies) / elapsed:.1f} 次/秒）")
+
+
+def main(argv):
+    threads = int(argv[1]) if len(argv) > 1 else 8
+    requests_per_thread = int(argv[2]) if len(argv) > 2 else 15
+    window = float(argv[3]) if len(argv) > 3 else 2.0
+    run(threads, requests_per_thread, window, limited=False)
+    run(threads, requests_per_thread, window, limited=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,298 @@
+"""
+Webhook 壓力測試：以測試用的 channel secret 產生簽章正確的 LINE webhook，
+混合 分帳／儲值公費／查詢 指令打到多個團體，經由 app.callback 處理，
+回覆交給假的 LineBotApi、試算表換成記憶體中的假 Sheets（tests/support/fake_sheets.py）。
+輸出整體吞吐量，以及每種指令的 p50/p95/p99 延遲（送出 webhook 到送出回覆）與平均外部呼叫次數。
+
+用法：
+    python benchmarks/bench_webhook_load.py [--requests 2000] [--concurrency 8] [--groups 50]
+        [--sheets-latency 0] [--async] [--save result.json] [--compare baseline.json]
+--compare 時任一指令的 p95 或外部呼叫次數超過基準的 (1 + tolerance) 倍即以非 0 結束，可放在 CI 中攔截退化。
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHANNEL_SECRET = "load-test-channel-secret"
+
+# 指令比例：分帳最多，其次是儲值與各種查詢
+COMMAND_MIX = [
+    (0.45, "split"),
+    (0.15, "top_up"),
+    (0.15, "fund_balance"),
+    (0.15, "records"),
+    (0.10, "fund_history"),
+]
+
+
+class StubLineBotApi:
+    """
+    取代 LineBotApi：記錄每個 reply token 的回覆時間，可加入固定延遲模擬 LINE API
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.replied_at = {}
+        self.texts = {}
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def reply_message(self, reply_token, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.replied_at[reply_token] = time.perf_counter()
+            self.texts[reply_token] = [m.text for m in messages]
+            self._done.notify_all()
+
+    def wait_for(self, count, timeout):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len(self.replied_at) < count and time.monotonic() < deadline:
+                self._done.wait(deadline - time.monotonic())
+            return len(self.replied_at)
+
+
+def sign(body, secret=CHANNEL_SECRET):
+    digest = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def build_payload(text, user_id, reply_token):
+    event = {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": uuid.uuid4().hex.upper(),
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": reply_token,
+        "message": {"id": str(random.getrandbits(48)), "type": "text", "text": text},
+    }
+    return json.dumps({"destination": "Uloadtest", "events": [event]}, ensure_ascii=False)
+
+
+# 成員名稱不可含數字，否則「人名+金額」的調整格式無法解析
+MEMBER_NAMES = ["寧", "誌", "小明", "小華", "阿寶", "小美", "大雄", "靜香", "胖虎", "小夫"]
+
+
+def build_groups(count, rng):
+    return {f"團{i}": rng.sample(MEMBER_NAMES, rng.randrange(3, 8)) for i in range(count)}
+
+
+def build_text(kind, group, members, rng):
+    if kind == "split":
+        adjustments = ""
+        if rng.random() < 0.3:
+            adjustments = f" {rng.choice(members)}+{rng.randrange(10, 100)}"
+        return f"分帳 {group} {rng.choice(['早餐', '午餐', '晚餐', '宵夜'])} {rng.randrange(100, 5000)}{adjustments}"
+    if kind == "top_up":
+        return f"儲值公費 {group} {rng.randrange(500, 5000)}"
+    if kind == "fund_balance":
+        return f"查詢公費餘額 {group}"
+    if kind == "records":
+        return f"查詢團體記帳 {group} 最近{rng.randrange(5, 20)}"
+    return f"查詢公費紀錄 {group}"
+
+
+def build_workload(groups, count, rng):
+    names = list(groups)
+    workload = []
+    for i in range(count):
+        roll, kind = rng.random(), COMMAND_MIX[-1][1]
+        for weight, candidate in COMMAND_MIX:
+            if roll < weight:
+                kind = candidate
+                break
+            roll -= weight
+        group = rng.choice(names)
+        text = build_text(kind, group, groups[group], rng)
+        reply_token = f"reply{i:06d}"
+        body = build_payload(text, f"U{names.index(group):031d}", reply_token)
+        workload.append((text, reply_token, body, sign(body)))
+    return workload
+
+
+def seed_spreadsheet(fake_client, groups):
+    from sheet_utils import MEAL_HEADER
+
+    spreadsheet = fake_client.spreadsheet
+    spreadsheet.seed("groups", [["group_name", "members"]] +
+                     [[name, ",".join(members)] for name, members in groups.items()])
+    spreadsheet.seed("group_funds", [["group_name", "member", "timestamp", "amount", "type"]])
+    for name in groups:
+        spreadsheet.seed(name, [MEAL_HEADER])
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def external_calls(counters):
+    calls = {}
+    for (name, labels), value in counters.items():
+        if name == "linebot_external_calls_total":
+            labels = dict(labels)
+            calls[(labels["command"], labels["service"])] = value
+    return calls
+
+
+def run(args):
+    os.environ["LINE_CHANNEL_SECRET"] = CHANNEL_SECRET
+    os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "load-test-token")
+    os.environ["STORAGE_BACKEND"] = "sheets"
+    os.environ.pop("WRITE_BEHIND", None)
+    os.environ["ASYNC_WEBHOOK"] = "1" if args.async_webhook else "0"
+    quota = str(args.quota or 10 ** 9)
+    os.environ["SHEETS_READ_PER_MINUTE"] = quota
+    os.environ["SHEETS_WRITE_PER_MINUTE"] = quota
+
+    import app as webhook_app
+    import metrics
+    import sheet_utils
+    from commands import command_name
+    from tests.support.fake_sheets import FakeClient, FakeSheetsServer
+
+    rng = random.Random(args.seed)
+    groups = build_groups(args.groups, rng)
+    server = FakeSheetsServer(read_per_minute=10 ** 9, write_per_minute=10 ** 9, latency=args.sheets_latency)
+    fake_client = FakeClient(server)
+    seed_spreadsheet(fake_client, groups)
+    sheet_utils.use_client(fake_client)
+    stub = StubLineBotApi(args.reply_latency)
+    webhook_app.line_bot_api = stub
+
+    workload = build_workload(groups, args.requests, rng)
+    sent_at = {}
+    cursor = iter(workload)
+    cursor_lock = threading.Lock()
+    status_errors = [0]
+
+    def worker():
+        test_client = webhook_app.app.test_client()
+        while True:
+            with cursor_lock:
+                item = next(cursor, None)
+            if item is None:
+                return
+            text, reply_token, body, signature = item
+            sent_at[reply_token] = time.perf_counter()
+            response = test_client.post("/callback", data=body.encode("utf-8"),
+                                        headers={"X-Line-Signature": signature,
+                                                 "Content-Type": "application/json"})
+            if response.status_code != 200:
+                status_errors[0] += 1
+
+    _, counters_before = metrics.snapshot()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    replied = stub.wait_for(len(workload), timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+    _, counters_after = metrics.snapshot()
+
+    before, after = external_calls(counters_before), external_calls(counters_after)
+    per_command = {}
+    for text, reply_token, _, _ in workload:
+        if reply_token not in stub.replied_at:
+            continue
+        entry = per_command.setdefault(command_name(text), {"latencies": [], "errors": 0})
+        entry["latencies"].append(stub.replied_at[reply_token] - sent_at[reply_token])
+        if stub.texts[reply_token][0].startswith("⚠️ 發生錯誤"):
+            entry["errors"] += 1
+
+    result = {"requests": len(workload), "replied": replied, "http_errors": status_errors[0],
+              "seconds": elapsed, "throughput": replied / elapsed, "commands": {}}
+    for name, entry in sorted(per_command.items()):
+        latencies = entry["latencies"]
+        calls = {
+            service: (value - before.get((command, service), 0)) / len(latencies)
+            for (command, service), value in after.items() if command == name
+        }
+        result["commands"][name] = {
+            "count": len(latencies),
+            "errors": entry["errors"],
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "calls_per_command": calls,
+        }
+    return result
+
+
+def report(result):
+    print(f"{result['replied']}/{result['requests']} 則已回覆，HTTP 錯誤 {result['http_errors']}，"
+          f"耗時 {result['seconds']:.2f} s，吞吐量 {result['throughput']:.1f} 則/秒")
+    print(f"{'指令':<10}{'筆數':>6}{'錯誤':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  外部呼叫／次")
+    for name, stats in result["commands"].items():
+        calls = ", ".join(f"{service} {value:.1f}" for service, value in sorted(stats["calls_per_command"].items()))
+        print(f"{name:<10}{stats['count']:>6}{stats['errors']:>6}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}  {calls}")
+
+
+def compare(result, baseline, tolerance):
+    """
+    回傳退化項目的說明；延遲低於 1 ms 的差異視為雜訊
+    """
+    regressions = []
+    for name, base in baseline["commands"].items():
+        current = result["commands"].get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + 1):
+            regressions.append(f"{name} p95 {base['p95_ms']:.1f} → {current['p95_ms']:.1f} ms")
+        for service, value in current["calls_per_command"].items():
+            base_value = base["calls_per_command"].get(service, 0)
+            if value > base_value * (1 + tolerance) + 0.05:
+                regressions.append(f"{name} {service} 呼叫 {base_value:.2f} → {value:.2f} 次")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="LINE webhook 壓力測試")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=20240601)
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="每個假 Sheets 請求的延遲（秒）")
+    parser.add_argument("--reply-latency", type=float, default=0.0, help="每次回覆的延遲（秒）")
+    parser.add_argument("--quota", type=int, default=0, help="Sheets 每分鐘讀寫配額，0 表示不限流")
+    parser.add_argument("--async", dest="async_webhook", action="store_true", help="使用 ASYNC_WEBHOOK 模式")
+    parser.add_argument("--timeout", type=float, default=120.0, help="等待所有回覆的秒數")
+    parser.add_argument("--save", help="將結果存成 JSON，作為之後比較的基準")
+    parser.add_argument("--compare", help="與基準 JSON 比較，退化時以非 0 結束")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv[1:])
+
+    result = run(args)
+    report(result)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print("⚠️ 退化：" + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,90 @@
+"""
+合成的發票 OCR 文字語料，附正確答案，供解析器的效能與準確度量測使用。
+以固定亂數種子產生，每次執行內容相同。
+"""
+import random
+
+ITEM_NAMES = ["珍珠奶茶", "雞排", "滷肉飯", "可樂 600ml", "御飯糰", "茶葉蛋", "拿鐵咖啡",
+              "牛肉麵", "水餃", "關東煮", "鮮奶", "洋芋片", "礦泉水", "便當", "蘋果"]
+STORES = ["全家便利商店", "7-ELEVEN", "萊爾富", "頂呱呱", "鼎泰豐"]
+
+
+def _invoice_number(rng):
+    letters = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(2))
+    return letters, f"{rng.randrange(10 ** 8):08d}"
+
+
+def _money(rng, value):
+    text = f"{value:,}" if value >= 1000 and rng.random() < 0.5 else str(value)
+    return rng.choice(["", "$"]) + text + rng.choice(["", "", "元", "TX"])
+
+
+def proof_of_invoice(rng):
+    """電子發票證明聯：沒有品項，只有號碼與總計"""
+    letters, digits = _invoice_number(rng)
+    total = rng.randrange(30, 5000)
+    text = "\n".join([
+        "電子發票證明聯",
+        f"{rng.choice([2023, 2024])}年{rng.choice(['01-02', '03-04', '05-06'])}月",
+        f"{letters}-{digits}",
+        f"2024-05-{rng.randrange(1, 29):02d} {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+        f"隨機碼 {rng.randrange(10000):04d} 總計 {total}",
+        f"賣方 {rng.randrange(10 ** 8):08d}",
+    ])
+    return text, {"invoice_number": letters + digits, "total": float(total), "items": []}
+
+
+def itemized_receipt(rng, item_count):
+    """附品項明細的收據"""
+    letters, digits = _invoice_number(rng)
+    lines = [rng.choice(STORES), f"2024/05/{rng.randrange(1, 29):02d} {rng.randrange(24):02d}:{rng.randrange(60):02d}",
+             f"發票號碼 {letters}{digits}" if rng.random() < 0.5 else f"{letters}-{digits}",
+             "品名 數量 金額"]
+    items = []
+    for _ in range(item_count):
+        name = rng.choice(ITEM_NAMES)
+        quantity = rng.randrange(1, 4)
+        amount = rng.randrange(10, 1500) * quantity
+        lines.append(f"{name} {quantity} {_money(rng, amount)}")
+        items.append({"name": name, "amount": float(amount)})
+    total = sum(int(item["amount"]) for item in items)
+    paid = total + rng.randrange(0, 500)
+    lines += [f"小計 {total}", f"總計 {_money(rng, total)}", f"現金 {paid}", f"找零 {paid - total}"]
+    return "\n".join(lines), {"invoice_number": letters + digits, "total": float(total), "items": items}
+
+
+FOOTER_PHRASES = ["感謝您的光臨", "退換貨請保留發票", "會員點數請至官網查詢", "本店保留活動修改權利",
+                  "Thank you for shopping with us", "Please keep this receipt", "歡迎再度光臨",
+                  "詳細活動辦法請洽門市人員", "Have a nice day", "營業時間請參閱門市公告"]
+
+
+def receipt_with_footer(rng, length):
+    """
+    收據後面接一大段沒有任何數字的文字（活動說明、條款等 OCR 結果），
+    舊版 (\D+?)\s+金額 的品項正規表示式在這類文字上會大量回溯
+    """
+    text, expected = itemized_receipt(rng, rng.randrange(1, 6))
+    footer = []
+    while sum(len(p) + 1 for p in footer) < length:
+        footer.append(rng.choice(FOOTER_PHRASES))
+    separator = rng.choice([" ", "\n"])  # OCR 有時會把整段條款辨識成同一行
+    return text + "\n" + separator.join(footer), expected
+
+
+def build_corpus(size=500, seed=20240601):
+    """
+    回傳 [(OCR 文字, 正確答案), ...]，混合證明聯、一般收據、超長收據與附長段文字的收據
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        kind = i % 20
+        if kind < 6:
+            corpus.append(proof_of_invoice(rng))
+        elif kind < 17:
+            corpus.append(itemized_receipt(rng, rng.randrange(1, 12)))
+        elif kind < 19:
+            corpus.append(itemized_receipt(rng, rng.randrange(80, 200)))
+        else:
+            corpus.append(receipt_with_footer(rng, rng.randrange(1000, 3000)))
+    return corpus
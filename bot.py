@@ -3,6 +3,7 @@ import os
 from linebot import LineBotApi, WebhookHandler
 from linebot.models import MessageEvent, TextMessage, TextSendMessage
 from commands import process_command
+from utils import split_message
 
 # LINE 設定
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
@@ -19,8 +20,8 @@ def handle_message(event):
     # 呼叫指令處理模組
     reply_text = process_command(user_id, user_message)
 
-    # 回應用戶
+    # 回應用戶（過長時拆成多則訊息）
     line_bot_api.reply_message(
         event.reply_token,
-        TextSendMessage(text=reply_text)
+        [TextSendMessage(text=chunk) for chunk in split_message(reply_text)]
     )
@@ -1,40 +1,160 @@
 # commands.py
-from features.command_guide import get_command_guide
-from features.personal_record import handle_personal_command
-from features.group_record import handle_group_command
-from features.invoice_record import handle_invoice_command
-from features.deletion import handle_delete_command
-from features.export_excel import handle_export_command
-from features.prize_check import handle_prize_check_command
+# LINE 指令的唯一入口，app.py 與 bot.py 共用
+import traceback
+from router import CommandRouter
+from utils import parse_history_options
+from lottery_check import check_lottery_bulk
+from sheet_utils import (
+    create_group, split_group_expense, get_group_records,
+    top_up_group_fund, format_group_fund_history,
+    delete_group_meal, reset_group_records,
+    format_group_fund_balance_report, format_group_settlement, normalize_group_name
+)
+from export_utils import format_export_reply
 
-def process_command(user_id, message):
-    # 指令導覽
-    if message.startswith("指令") or message.lower().startswith("help"):
-        return get_command_guide()
+HELP_MESSAGE = """
+📌 團體記帳指令總覽
+
+1. 🏗️ 建立團體記帳
+建立團體記帳 [團名] [成員1] [成員2] ...
+例：建立團體記帳 大阪 寧 誌 小白
+
+2. 🍱 分帳
+分帳 [團名] [餐別] [總金額] [人名+/-調整金額...]
+例：分帳 大阪 早餐 2300 寧+300
+
+3. 📊 查詢團體記帳
+查詢團體記帳 [團名] [最近N | 第k頁] [起始日期] [結束日期]
+例：查詢團體記帳 大阪 最近10
+例：查詢團體記帳 大阪 2024/06/01 2024/06/03
+
+4. 💰 儲值公費
+儲值公費 [團名] [總金額]
+儲值公費 [團名] 小明+300 小花+200
+例：儲值公費 大阪 3000
+例：儲值公費 大阪 小明+500 小花+200
+
+5. 📜 查詢公費紀錄
+查詢公費紀錄 [團名] [最近N | 第k頁] [起始日期] [結束日期]
+例：查詢公費紀錄 大阪 第2頁
+
+6. 💵 查詢公費餘額
+查詢公費餘額 [團名]
+
+7. ❌ 刪除餐別
+刪除餐別 [團名] [日期] [餐別]
+例：刪除餐別 大阪 2024/06/03 早餐
+
+8. 🔄 重設團體記帳
+重設團體記帳 [團名]
+
+9. 💸 結算
+結算 [團名]
+列出每人應收／應付金額與最少筆數的轉帳方式
+
+10. 🎫 查詢中獎
+查詢中獎 [期別(可省略)] [發票號碼1] [發票號碼2] ...
+例：查詢中獎 11305 AB12345678 CD87654321
+
+11. 📥 匯出
+匯出 [團名] [csv(可省略)]
+回覆 Excel（或 CSV）下載連結，包含所有餐別與公費紀錄
+"""
 
-    # 個人記帳
-    if message.startswith("個人記帳"):
-        return handle_personal_command(user_id, message)
+def unknown_command(text):
+    return f"❓ 無法識別的指令，請參考以下指令：\n\n{HELP_MESSAGE}"
 
-    # 團體記帳
-    if message.startswith("團體記帳"):
-        return handle_group_command(user_id, message)
+router = CommandRouter(fallback=unknown_command)
 
-    # 個人發票記帳 or 團體發票記帳
-    if message.startswith("個人發票記帳") or message.startswith("發票記帳"):
-        return handle_invoice_command(user_id, message)
+@router.command("/help", "help", "指令")
+def show_help(user_id):
+    return HELP_MESSAGE
 
-    # 查詢中獎
-    if message.startswith("查詢中獎"):
-        return handle_prize_check_command(user_id, message)
+@router.command("建立團體記帳", pattern=r"(\S+)\s+(.+)",
+                usage="❗請提供團名與至少一位成員，例如：建立團體記帳 大阪 寧 誌")
+def handle_create_group(user_id, group_name, members):
+    if create_group(group_name, members.split()):
+        return f"✅ 已建立團體：{group_name}"
+    return f"⚠️ 團體 {group_name} 已存在"
 
-    # 匯出 Excel
-    if message.startswith("匯出"):
-        return handle_export_command(user_id, message)
+@router.command("分帳", pattern=r"(\S+)\s+(\S+)\s+(\d+)(.*)",
+                usage="❗格式錯誤，請參考：分帳 [團名] [餐別] [總金額] [人名+/-調整金額...]")
+def handle_split(user_id, group_name, meal_name, total_amount, raw_adjustments):
+    return split_group_expense(group_name, meal_name, int(total_amount), raw_adjustments.split())
 
-    # 刪除記錄流程
-    if message.startswith("刪除"):
-        return handle_delete_command(user_id, message)
+@router.command("查詢團體記帳", pattern=r"(\S+)(.*)",
+                usage="❗請提供團名，例如：查詢團體記帳 大阪")
+def handle_group_records(user_id, group_name, raw_options):
+    options = parse_history_options(raw_options.split())
+    if options is None:
+        return "❗格式錯誤，請參考：查詢團體記帳 [團名] [最近N | 第k頁] [起始日期] [結束日期]"
+    return get_group_records(group_name, **options)
 
-    # 無法辨識的指令
-    return "無法辨識的指令，請輸入「指令」查看使用說明。"
+@router.command("儲值公費", pattern=r"(\S+)\s+(.+)",
+                usage="❗請提供團名與總金額或個人儲值明細，例如：儲值公費 大阪 3000")
+def handle_top_up(user_id, group_name, raw_amounts):
+    parts = raw_amounts.split()
+    if len(parts) == 1 and parts[0].isdigit():
+        return top_up_group_fund(group_name, int(parts[0]))
+    return top_up_group_fund(group_name, contributions=parts)
+
+@router.command("查詢公費紀錄", pattern=r"(\S+)(.*)",
+                usage="❗請提供團名，例如：查詢公費紀錄 大阪")
+def handle_fund_history(user_id, group_name, raw_options):
+    options = parse_history_options(raw_options.split())
+    if options is None:
+        return "❗格式錯誤，請參考：查詢公費紀錄 [團名] [最近N | 第k頁] [起始日期] [結束日期]"
+    return format_group_fund_history(group_name, **options)
+
+@router.command("查詢公費餘額", pattern=r"(\S+).*",
+                usage="❗請提供團名，例如：查詢公費餘額 大阪")
+def handle_fund_balance(user_id, group_name):
+    return format_group_fund_balance_report(group_name)
+
+@router.command("刪除餐別", pattern=r"(\S+)\s+(\S+)\s+(\S+)",
+                usage="❗請提供格式：刪除餐別 [團名] [日期] [餐別]")
+def handle_delete_meal(user_id, group_name, date_str, meal_name):
+    return delete_group_meal(group_name, date_str, meal_name)
+
+@router.command("重設團體記帳", pattern=r"(\S+).*",
+                usage="❗請提供團名，例如：重設團體記帳 大阪")
+def handle_reset(user_id, group_name):
+    return reset_group_records(group_name)
+
+@router.command("結算", pattern=r"(\S+).*",
+                usage="❗請提供團名，例如：結算 大阪")
+def handle_settlement(user_id, group_name):
+    return format_group_settlement(group_name)
+
+@router.command("查詢中獎", pattern=r"(?:(\d{5})\s+)?((?!\d{5}$)\S.*)",
+                usage="❗請提供發票號碼，例如：查詢中獎 AB12345678 CD87654321")
+def handle_prize_check(user_id, period, raw_numbers):
+    return check_lottery_bulk(raw_numbers.split(), period)
+
+@router.command("匯出", pattern=r"(\S+)(?:\s+(csv|CSV|xlsx|XLSX))?\s*",
+                usage="❗請提供團名，例如：匯出 大阪 或 匯出 大阪 csv")
+def handle_export(user_id, group_name, file_format):
+    return format_export_reply(group_name, csv_format=(file_format or "").lower() == "csv")
+
+def command_name(message):
+    """
+    訊息對應的指令名稱，作為指標的 label；無法識別的訊息一律歸為 unknown，避免 label 數量無上限
+    """
+    command, _ = router.resolve(message)
+    return command.name if command else "unknown"
+
+def order_key(message):
+    """
+    同一個團體的指令依序處理：以指令的第一個參數（團名）為 key，
+    「分帳大阪 ...」這類指令與團名之間沒有空白的訊息也能取到團名；無法識別或沒有參數時回傳 None
+    """
+    command, args = router.resolve(message)
+    parts = args.split(None, 1) if command else []
+    return normalize_group_name(parts[0]) if parts else None
+
+def process_command(user_id, message):
+    try:
+        return router.dispatch(message, user_id)
+    except Exception as e:
+        print("⚠️ Error:", traceback.format_exc())
+        return f"⚠️ 發生錯誤：{str(e)}"
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryDedupStore:
+    """
+    行程內的去重紀錄：依寫入順序保存 key 與到期時間，超過 TTL 或筆數上限時從最舊的開始淘汰
+    """
+
+    def __init__(self, ttl=3600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """
+        key 第一次出現（或前一次已過期）時記錄並回傳 True，重複時回傳 False
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._entries:
+                oldest, expires_at = next(iter(self._entries.items()))
+                if expires_at > now and len(self._entries) < self.max_entries:
+                    break
+                del self._entries[oldest]
+            if key in self._entries:
+                return False
+            self._entries[key] = now + self.ttl
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteDedupStore:
+    """
+    以 SQLite 保存去重紀錄，同一台機器上的多個 gunicorn worker 共用，重新啟動後仍有效。
+    以 INSERT OR IGNORE 的 rowcount 判斷是否為第一次出現，檢查與寫入在同一個陳述式完成。
+    """
+
+    PURGE_EVERY = 500  # 每寫入幾筆清一次過期與超量的紀錄
+
+    def __init__(self, path, ttl=3600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_events ("
+            " key TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_expires ON seen_events (expires_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    def add(self, key):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM seen_events WHERE key = ? AND expires_at <= ?", (key, now))
+                added = self._conn.execute(
+                    "INSERT OR IGNORE INTO seen_events (key, expires_at) VALUES (?, ?)",
+                    (key, now + self.ttl),
+                ).rowcount == 1
+            if added:
+                self._inserts += 1
+                if self._inserts % self.PURGE_EVERY == 0:
+                    self._purge(now)
+            return added
+
+    def _purge(self, now):
+        with self._conn:
+            self._conn.execute("DELETE FROM seen_events WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM seen_events WHERE key IN ("
+                " SELECT key FROM seen_events ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen_events").fetchone()[0]
+
+
+class WebhookDeduplicator:
+    """
+    LINE 在逾時未收到回應時會重送同一個 webhook 事件（deliveryContext.isRedelivery 為 true），
+    以 webhookEventId（舊版事件沒有時改用 replyToken）去重，重送的事件在進入任何記帳邏輯前就略過。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "suppressed": 0, "redeliveries": 0}
+
+    @staticmethod
+    def event_key(event):
+        """
+        event 為 webhook 原始 JSON 中的單一事件
+        """
+        return event.get("webhookEventId") or event.get("replyToken")
+
+    def is_duplicate(self, event):
+        key = self.event_key(event)
+        redelivery = bool((event.get("deliveryContext") or {}).get("isRedelivery"))
+        duplicate = key is not None and not self.store.add(key)
+        with self._lock:
+            self.stats["checked"] += 1
+            self.stats["redeliveries"] += int(redelivery)
+            self.stats["suppressed"] += int(duplicate)
+        return duplicate
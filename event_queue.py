@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+import traceback
+import zlib
+
+
+class OrderedWorkerPool:
+    """
+    依 key 將工作分派到固定的 worker：同一個 key 永遠由同一條執行緒依序處理，
+    不同 key 可以並行。每條 worker 的佇列有上限，佇列滿時呼叫端會被阻塞（背壓）。
+    """
+
+    def __init__(self, workers=4, max_queue=100):
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "blocked": 0,       # 因佇列已滿而必須等待的送出次數
+            "max_depth": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        self._threads = []
+        for q in self._queues:
+            t = threading.Thread(target=self._run, args=(q,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key, func, *args):
+        if self._closed:
+            raise RuntimeError("worker pool 已關閉")
+        q = self._queues[zlib.crc32(str(key).encode("utf-8")) % len(self._queues)]
+        with self._lock:
+            self.stats["submitted"] += 1
+            if q.full():
+                self.stats["blocked"] += 1
+        q.put((time.monotonic(), func, args))
+        with self._lock:
+            self.stats["max_depth"] = max(self.stats["max_depth"], self.queue_depth())
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                q.task_done()
+                return
+            enqueued_at, func, args = item
+            wait = time.monotonic() - enqueued_at
+            with self._lock:
+                self.stats["wait_seconds_total"] += wait
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+            try:
+                func(*args)
+                with self._lock:
+                    self.stats["completed"] += 1
+            except Exception:
+                print("⚠️ Worker error:", traceback.format_exc())
+                with self._lock:
+                    self.stats["failed"] += 1
+            finally:
+                q.task_done()
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def metrics(self):
+        with self._lock:
+            result = dict(self.stats)
+        result["depth"] = self.queue_depth()
+        done = result["completed"] + result["failed"]
+        result["wait_seconds_avg"] = result["wait_seconds_total"] / done if done else 0.0
+        return result
+
+    def shutdown(self, timeout=30):
+        """
+        停止接收新工作，並等待佇列中已排入的工作處理完畢
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))
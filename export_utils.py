@@ -0,0 +1,152 @@
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import os
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from meal_index import meal_adjustments
+from sheet_utils import get_backend, get_group_members
+
+# 下載網址的簽章金鑰與有效時間；PUBLIC_BASE_URL 為外部可連到本服務的網址，例如 https://xxx.herokuapp.com
+EXPORT_SECRET = os.getenv("EXPORT_SECRET") or os.getenv("LINE_CHANNEL_SECRET") or ""
+EXPORT_URL_TTL = int(os.getenv("EXPORT_URL_TTL", "3600"))  # 秒
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))  # 每次向儲存後端讀取的列數
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+
+MEAL_EXPORT_HEADER = ["時間", "餐別", "金額", "付款人", "調整"]
+FUND_EXPORT_HEADER = ["團名", "成員", "時間", "金額", "類型"]
+
+# 匯出種類：xlsx 含兩個工作表；CSV 每個檔案一張表
+EXPORT_KINDS = {
+    "xlsx": "xlsx",
+    "meals": "csv",
+    "funds": "csv",
+}
+
+
+def _cell(value):
+    """
+    試算表讀回的數字是字串，轉回數值讓 Excel 可以直接加總
+    """
+    text = str(value).strip()
+    if text.lstrip("-").isdigit():
+        return int(text)
+    return text
+
+
+def meal_export_rows(group):
+    """
+    逐頁產生餐別列，多個調整欄合併成一格（不含紀錄編號）
+    """
+    for rows in get_backend().iter_meal_rows(group, EXPORT_PAGE_SIZE):
+        for row in rows:
+            padded = list(row) + [""] * (4 - len(row))
+            yield [_cell(v) for v in padded[:4]] + [" ".join(meal_adjustments(row))]
+
+
+def fund_export_rows(group):
+    for rows in get_backend().iter_fund_rows(group, EXPORT_PAGE_SIZE):
+        for row in rows:
+            row = list(row) + [""] * (5 - len(row))
+            yield [_cell(v) for v in row[:5]]
+
+
+def write_xlsx(group, path):
+    """
+    以 openpyxl 的 write-only 模式逐列寫出，工作表內容直接寫入暫存檔，
+    記憶體用量與紀錄筆數無關
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, header, rows in (("餐別紀錄", MEAL_EXPORT_HEADER, meal_export_rows(group)),
+                                ("公費紀錄", FUND_EXPORT_HEADER, fund_export_rows(group))):
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def build_xlsx_file(group):
+    """
+    產生 xlsx 暫存檔並回傳路徑，呼叫端負責刪除
+    """
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        write_xlsx(group, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_csv(group, kind):
+    """
+    逐頁產生 CSV 內容（UTF-8 BOM，Excel 開啟中文不會亂碼），可直接交給串流回應
+    """
+    header, rows = ((MEAL_EXPORT_HEADER, meal_export_rows(group)) if kind == "meals"
+                    else (FUND_EXPORT_HEADER, fund_export_rows(group)))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield "\ufeff" + _drain(buffer)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_PAGE_SIZE == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+# ==== 簽章網址 ====
+
+def export_signature(group, kind, expires):
+    message = f"{group}\n{kind}\n{expires}".encode("utf-8")
+    digest = hmac.new(EXPORT_SECRET.encode("utf-8"), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def verify_export(group, kind, expires, signature):
+    """
+    簽章正確且尚未過期時回傳 True；沒有設定簽章金鑰時一律拒絕，否則任何人都能以空金鑰偽造連結
+    """
+    if not EXPORT_SECRET:
+        return False
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time() or kind not in EXPORT_KINDS:
+        return False
+    return hmac.compare_digest(export_signature(group, kind, expires), signature or "")
+
+
+def export_url(group, kind):
+    expires = int(time.time()) + EXPORT_URL_TTL
+    query = urlencode({"group": group, "kind": kind, "expires": expires,
+                       "sig": export_signature(group, kind, expires)})
+    return f"{PUBLIC_BASE_URL}/export?{query}"
+
+
+def format_export_reply(group, csv_format=False):
+    if not PUBLIC_BASE_URL or not EXPORT_SECRET:
+        return "⚠️ 尚未設定 PUBLIC_BASE_URL 或簽章金鑰，無法產生下載連結"
+    get_group_members(group)  # 團體不存在時拋出「找不到團體」
+    minutes = EXPORT_URL_TTL // 60
+    if csv_format:
+        return (f"📥【{group}】匯出（CSV，{minutes} 分鐘內有效）：\n"
+                f"餐別紀錄：{export_url(group, 'meals')}\n"
+                f"公費紀錄：{export_url(group, 'funds')}")
+    return f"📥【{group}】匯出（Excel，{minutes} 分鐘內有效）：\n{export_url(group, 'xlsx')}"
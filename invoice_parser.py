@@ -0,0 +1,80 @@
+import re
+
+# 解析結果的版本：修改本模組的解析規則時請遞增，OCR 快取中舊版本的解析結果會重新解析
+PARSER_VERSION = 2
+
+# 發票號碼：兩個英文字母加 8 位數字，OCR 常會在中間多一個 -，例如 AB-12345678
+INVOICE_NUMBER = re.compile(r'\b([A-Z]{2})-?(\d{8})\b')
+# 單一金額 token，例如 120、1,280、$99、350元、45TX
+AMOUNT_TOKEN = re.compile(r'[$＄]?(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?(?:元|TX)?')
+QUANTITY = re.compile(r'[xX*]?\d{1,3}')
+TOTAL_LINE = re.compile(r'總計|合計|總額|應付|total', re.IGNORECASE)
+# 不是品項的行：小計、付款、統編等欄位，以及日期時間
+SKIP_LINE = re.compile(
+    r'小計|找零|收現|現金|統編|隨機碼|賣方|買方|稅額|載具|電子發票|品名|數量|單價|金額'
+    r'|\d{2,4}[-/年.]\d{1,2}[-/月.]\d{1,2}|\d{1,2}:\d{2}')
+
+
+def parse_amount(token):
+    """
+    token 為金額時回傳數值，否則回傳 None
+    """
+    if token.isascii() and token.isdigit():
+        return float(token)
+    match = AMOUNT_TOKEN.fullmatch(token)
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    if match.group(2):
+        value += float(f"0.{match.group(2)}")
+    return value
+
+
+def parse_invoice_text(text):
+    """
+    單次逐行掃描 OCR 文字，回傳 {"invoice_number", "total", "items"}。
+    每行只從右側切出最後一個 token 判斷是否為金額，不使用會回溯的品項正規表示式。
+    總金額優先採用「總計／合計」等關鍵字所在行，否則採用最後出現的金額。
+    """
+    invoice_number = ""
+    keyword_total = None
+    last_amount = 0
+    items = []
+
+    for raw_line in (text or "").splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if not invoice_number:
+            match = INVOICE_NUMBER.search(line)
+            if match:
+                invoice_number = match.group(1) + match.group(2)
+                continue
+
+        tokens = line.rsplit(None, 1)
+        head, last = (tokens[0], tokens[1]) if len(tokens) == 2 else ("", tokens[0])
+        amount = parse_amount(last)
+        if amount is None:
+            continue
+        last_amount = amount
+
+        if TOTAL_LINE.search(line):
+            if keyword_total is None:
+                keyword_total = amount
+            continue
+        if SKIP_LINE.search(line):
+            continue
+
+        name = head.strip()
+        name_tokens = name.rsplit(None, 1)
+        if len(name_tokens) == 2 and QUANTITY.fullmatch(name_tokens[1]):
+            name = name_tokens[0]  # 去掉品名後面的數量欄
+        if name and not parse_amount(name.replace(" ", "")):
+            items.append({"name": name, "amount": amount})
+
+    return {
+        "invoice_number": invoice_number,
+        "total": keyword_total if keyword_total is not None else last_amount,
+        "items": items,
+    }
@@ -1,28 +1,8 @@
-from google.cloud import vision
-import os
+from invoice_parser import parse_invoice_text
+from vision_utils import extract_text_from_image
 
-# Initialize Google Vision Client
-client = vision.ImageAnnotatorClient()
-
-def extract_invoice_data(image_path):
-    """Extract items and amount from the invoice image."""
-    with open(image_path, 'rb') as image_file:
-        content = image_file.read()
-    
-    image = vision.Image(content=content)
-    response = client.text_detection(image=image)
-    
-    texts = response.text_annotations
-    if texts:
-        items = []
-        amount = 0
-        
-        for text in texts:
-            # Add logic to detect items and amounts
-            if re.match(r'\d+', text.description):  # Example for amount detection
-                amount = float(text.description)
-            else:
-                items.append(text.description)
-        
-        return items, amount
-    return [], 0
+def extract_invoice_data(image):
+    """Extract items and amount from the invoice image (bytes, file object or path)."""
+    # 經由 vision_utils 辨識，與其他發票功能共用 Vision client、OCR 快取與指標
+    parsed = parse_invoice_text(extract_text_from_image(image))
+    return [item["name"] for item in parsed["items"]], parsed["total"]
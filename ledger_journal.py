@@ -0,0 +1,156 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+
+class LedgerJournal:
+    """
+    寫入 Google Sheets 前的本地日誌（SQLite WAL 模式）。
+    append() 落地到磁碟後即可回覆使用者，背景執行緒再依時間或筆數門檻，
+    把同一分頁的列合併成一次 append_rows 寫出。
+    重新啟動時會先把尚未寫出的列補寫，確保 dyno 中斷也不會遺失資料。
+    寫出成功但尚未從日誌刪除前中斷時，該批會再寫一次（至少一次語意）。
+    多個 gunicorn worker 共用同一個日誌檔時，每次寫出前先以單一 UPDATE 認領尚未被認領的列，
+    同一列只會由一個 worker 寫出；認領後超過 claim_timeout 秒仍未刪除（worker 中斷）才可再被認領。
+    交給 flush_func 前先記錄嘗試次數：寫出後、刪除前中斷（或寫出逾時但其實已寫入），
+    下次以 flush_func(分頁, 列, replay=True) 補寫，由 flush_func 略過試算表中已有的列。
+    background 是背景執行緒每次寫出時使用的 context manager（例如降低配額優先順序），
+    查詢前由使用者的執行緒呼叫 flush() 則沿用呼叫端的設定。
+    """
+
+    def __init__(self, path, flush_func, flush_interval=5.0, flush_size=200, claim_timeout=600.0,
+                 background=contextlib.nullcontext):
+        self._flush_func = flush_func
+        self._background = background
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.claim_timeout = claim_timeout
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " sheet TEXT NOT NULL,"
+            " row TEXT NOT NULL,"
+            " claimed_by TEXT,"
+            " claimed_at REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {"appended_rows": 0, "flushed_rows": 0, "flush_calls": 0, "flush_errors": 0}
+
+    def append(self, batches):
+        """
+        batches: [(分頁名稱, [列, ...]), ...]，同一次呼叫的所有列在同一個交易中寫入
+        """
+        with self._lock:
+            with self._conn:
+                for sheet, rows in batches:
+                    self._conn.executemany(
+                        "INSERT INTO pending (sheet, row) VALUES (?, ?)",
+                        [(sheet, json.dumps(row, ensure_ascii=False)) for row in rows],
+                    )
+            self.stats["appended_rows"] += sum(len(rows) for _, rows in batches)
+            size = self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        if size >= self.flush_size:
+            self._wake.set()
+
+    def pending_rows(self, sheet=None):
+        with self._lock:
+            if sheet is None:
+                cursor = self._conn.execute("SELECT sheet, row FROM pending ORDER BY id")
+            else:
+                cursor = self._conn.execute(
+                    "SELECT sheet, row FROM pending WHERE sheet = ? ORDER BY id", (sheet,))
+            return [(name, json.loads(row)) for name, row in cursor.fetchall()]
+
+    def flush(self):
+        """
+        把日誌中的列依分頁合併寫出，每個分頁一次 flush_func 呼叫；
+        只寫出本 worker 認領到的列，寫出失敗時釋放尚未寫出的列讓下次（或其他 worker）重試
+        """
+        with self._flush_lock:
+            records = self._claim()
+            batches = {}
+            for row_id, sheet, row, attempts in records:
+                ids, rows, replay = batches.setdefault(sheet, ([], [], [False]))
+                ids.append(row_id)
+                rows.append(json.loads(row))
+                replay[0] = replay[0] or attempts > 0
+            try:
+                for sheet, (ids, rows, replay) in batches.items():
+                    with self._lock:
+                        with self._conn:
+                            self._conn.executemany(
+                                "UPDATE pending SET attempts = attempts + 1 WHERE id = ?", [(i,) for i in ids])
+                    self._flush_func(sheet, rows, replay=replay[0])
+                    with self._lock:
+                        with self._conn:
+                            self._conn.executemany(
+                                "DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+                    self.stats["flushed_rows"] += len(rows)
+                    self.stats["flush_calls"] += 1
+            finally:
+                self._release()
+
+    def _claim(self):
+        """
+        以單一 UPDATE 認領尚未被認領（或認領已逾時）的列，SQLite 的寫入鎖保證同一列只會被一個 worker 認領
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE pending SET claimed_by = ?, claimed_at = ?"
+                    " WHERE claimed_by IS NULL OR claimed_at < ?",
+                    (self._owner, now, now - self.claim_timeout),
+                )
+            return self._conn.execute(
+                "SELECT id, sheet, row, attempts FROM pending WHERE claimed_by = ? ORDER BY id",
+                (self._owner,)).fetchall()
+
+    def _release(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE pending SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?",
+                    (self._owner,))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                with self._background():
+                    self.flush()
+            except Exception:
+                self.stats["flush_errors"] += 1
+                print("⚠️ Journal flush error:", traceback.format_exc())
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def close(self, timeout=30):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            with self._background():
+                self.flush()
+        except Exception:
+            print("⚠️ Journal flush error:", traceback.format_exc())
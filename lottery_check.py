@@ -1,7 +1,131 @@
-def check_lottery(invoice_number):
-    # Placeholder for lottery checking logic
-    winning_numbers = ["123456789", "987654321"]  # Example winning numbers
-    if invoice_number in winning_numbers:
-        return f"發票號碼 {invoice_number} 中獎了！"
-    else:
-        return f"發票號碼 {invoice_number} 沒有中獎。"
+"""
+統一發票對獎。
+
+每期中獎號碼放在 LOTTERY_DIR 底下的 JSON 檔，檔名為期別（民國年＋雙月的起始月份），
+例如 lottery_numbers/11305.json：
+{
+    "period": "113年05-06月",
+    "special": "12345678",
+    "grand": "87654321",
+    "first": ["11111111", "22222222", "33333333"],
+    "additional_sixth": ["123"]
+}
+"""
+import json
+import os
+import re
+
+LOTTERY_DIR = os.getenv("LOTTERY_DIR", "lottery_numbers")
+
+# 頭獎號碼末 N 碼相同的獎別，由長到短比對
+SUFFIX_PRIZES = [
+    (8, "頭獎", 200000),
+    (7, "二獎", 40000),
+    (6, "三獎", 10000),
+    (5, "四獎", 4000),
+    (4, "五獎", 1000),
+    (3, "六獎", 200),
+]
+
+INVOICE_DIGITS = re.compile(r'(?:[A-Za-z]{2}-?)?(\d{8})')
+
+_draws = {}
+
+
+class LotteryDraw:
+    """
+    單期中獎號碼。頭獎號碼依末 3～8 碼分別建成雜湊集合，
+    每張發票最多只需 6 次集合查詢，與中獎號碼數量無關。
+    """
+
+    def __init__(self, period, special, grand, first, additional_sixth=()):
+        self.period = period
+        self.full_prizes = {special: ("特別獎", 10000000), grand: ("特獎", 2000000)}
+        self.suffix_sets = {
+            length: {number[-length:] for number in first}
+            for length, _, _ in SUFFIX_PRIZES
+        }
+        self.additional_sixth = set(additional_sixth)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("period", ""), data["special"], data["grand"],
+                   data["first"], data.get("additional_sixth", []))
+
+    def check(self, invoice_number):
+        """
+        回傳 (獎別, 獎金)；沒中獎或號碼格式錯誤時回傳 None
+        """
+        match = INVOICE_DIGITS.fullmatch(invoice_number.strip())
+        if not match:
+            return None
+        digits = match.group(1)
+        if digits in self.full_prizes:
+            return self.full_prizes[digits]
+        for length, name, amount in SUFFIX_PRIZES:
+            if digits[-length:] in self.suffix_sets[length]:
+                return name, amount
+        if digits[-3:] in self.additional_sixth:
+            return "增開六獎", 200
+        return None
+
+    def check_many(self, invoice_numbers):
+        """
+        一次對多張發票，回傳 {發票號碼: (獎別, 獎金)}，只包含中獎的發票
+        """
+        winners = {}
+        for number in invoice_numbers:
+            prize = self.check(number)
+            if prize:
+                winners[number] = prize
+        return winners
+
+
+def latest_period(directory=LOTTERY_DIR):
+    if not os.path.isdir(directory):
+        return None
+    periods = sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+    return periods[-1] if periods else None
+
+
+def load_draw(period=None, directory=LOTTERY_DIR):
+    """
+    讀取並快取指定期別的中獎號碼；period 為 None 時使用最新一期。找不到時回傳 None
+    """
+    period = period or latest_period(directory)
+    if period is None:
+        return None
+    if period not in _draws:
+        path = os.path.join(directory, f"{period}.json")
+        if not os.path.exists(path):
+            return None
+        _draws[period] = LotteryDraw.from_file(path)
+    return _draws[period]
+
+
+def check_lottery(invoice_number, period=None):
+    draw = load_draw(period)
+    if draw is None:
+        return "⚠️ 尚未載入該期的中獎號碼"
+    prize = draw.check(invoice_number)
+    if prize:
+        return f"發票號碼 {invoice_number} 中獎了！{prize[0]} {prize[1]} 元"
+    return f"發票號碼 {invoice_number} 沒有中獎。"
+
+
+def check_lottery_bulk(invoice_numbers, period=None):
+    """
+    一次對多張發票，回傳整理好的訊息
+    """
+    draw = load_draw(period)
+    if draw is None:
+        return "⚠️ 尚未載入該期的中獎號碼"
+    winners = draw.check_many(invoice_numbers)
+    title = f"🎫 {draw.period} 對獎結果（共 {len(invoice_numbers)} 張）"
+    if not winners:
+        return f"{title}\n沒有中獎的發票"
+    lines = [title] + [f"{number}：{name} {amount} 元" for number, (name, amount) in winners.items()]
+    lines.append(f"總獎金：{sum(amount for _, amount in winners.values())} 元")
+    return "\n".join(lines)
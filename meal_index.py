@@ -0,0 +1,254 @@
+import bisect
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+# 團體分頁欄位順序：時間, 餐別, 金額, 付款人, 紀錄編號, 調整...
+# 每次指令寫入的列共用一個紀錄編號（group_funds 在第 6 欄）：分帳的餐別列與扣款列以此對應，
+# 延遲寫入補寫時也以此判斷該列是否已經寫入；舊資料的紀錄編號為空白
+MEAL_TIME_COL = 0
+MEAL_NAME_COL = 1
+MEAL_PAYER_COL = 3
+MEAL_ID_COL = 4
+MEAL_ADJUST_COL = 5
+SPLIT_PAYER = "系統"  # 分帳產生的餐別列付款人
+
+LEGACY_LINK_WINDOW = timedelta(minutes=1)
+TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+
+def date_key(value):
+    return str(value).strip()[:10].replace("/", "-")
+
+
+def new_record_id():
+    return uuid.uuid4().hex[:12]
+
+
+def meal_record_id(row):
+    """
+    餐別列的紀錄編號；舊資料回傳空字串
+    """
+    return str(row[MEAL_ID_COL]).strip() if len(row) > MEAL_ID_COL else ""
+
+
+def meal_adjustments(row):
+    return [str(v).strip() for v in row[MEAL_ADJUST_COL:] if str(v).strip()]
+
+
+def parse_timestamp(value):
+    text = str(value).strip().replace("/", "-")
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class MealIndex:
+    """
+    每個團體分頁的 (日期, 餐別) → 列號 索引，同時記錄每列的紀錄編號與付款人。
+    第一次使用時以一次範圍讀取（只讀前五欄）建立，之後寫入時就地更新；
+    每個團體有一個版本號，寫入或刪除都會遞增，刪除前用來確認規劃後沒有其他修改。
+    """
+
+    def __init__(self, normalize=str):
+        self._normalize = normalize
+        self._lock = threading.Lock()
+        self._groups = {}  # 團名 → {"rows": [(列號, 時間, 餐別, 紀錄編號, 付款人), ...], "last_row": 列號, "version": 版本}
+        self.stats = {"loads": 0, "incremental_rows": 0}
+
+    @staticmethod
+    def _entry(row_no, row):
+        return (row_no, str(row[MEAL_TIME_COL]).strip(), str(row[MEAL_NAME_COL]).strip(),
+                meal_record_id(row), str(row[MEAL_PAYER_COL]).strip() if len(row) > MEAL_PAYER_COL else "")
+
+    def loaded(self, group):
+        with self._lock:
+            return self._normalize(group) in self._groups
+
+    def load(self, group, values):
+        """
+        values: 第 2 列起的 [時間, 餐別, 金額, 付款人, 紀錄編號] 內容
+        """
+        rows = [
+            self._entry(row_no, row)
+            for row_no, row in enumerate(values, start=2)
+            if len(row) > MEAL_NAME_COL and str(row[MEAL_TIME_COL]).strip()
+        ]
+        with self._lock:
+            previous = self._groups.get(self._normalize(group))
+            self._groups[self._normalize(group)] = {
+                "rows": rows,
+                "last_row": len(values) + 1,
+                "version": previous["version"] + 1 if previous else 0,
+            }
+            self.stats["loads"] += 1
+
+    def last_row(self, group):
+        """
+        已納入索引的最後一列列號（含標題列）；索引尚未建立時回傳 None
+        """
+        with self._lock:
+            entry = self._groups.get(self._normalize(group))
+            return entry["last_row"] if entry else None
+
+    def verify(self, group, tail):
+        """
+        tail: 分頁第 last_row 列之後的所有內容，只有一列且與索引的最後一列相同才一致
+        """
+        with self._lock:
+            entry = self._groups.get(self._normalize(group))
+            if entry is None or len(tail) != 1:
+                return False
+            if entry["last_row"] == 1:
+                return True  # 只有標題列
+            rows = entry["rows"]
+            return bool(rows) and rows[-1] == self._entry(entry["last_row"], tail[0])
+
+    def rows(self, group):
+        """
+        回傳該團體的 [(列號, 時間), ...]，依寫入順序排列
+        """
+        with self._lock:
+            entry = self._groups.get(self._normalize(group), {"rows": []})
+            return [(row_no, timestamp) for row_no, timestamp, *_ in entry["rows"]]
+
+    def next_range(self, group, count):
+        """
+        接在該團體最後一列之後寫入 count 列時的 (起始列, 結束列)；索引尚未建立時回傳 None
+        """
+        with self._lock:
+            entry = self._groups.get(self._normalize(group))
+            if entry is None:
+                return None
+            return entry["last_row"] + 1, entry["last_row"] + count
+
+    def apply(self, group, rows, row_range):
+        """
+        把剛寫入的餐別列套用到索引；寫入位置與索引不連續時捨棄該團體的索引，下次重新讀取
+        """
+        key = self._normalize(group)
+        with self._lock:
+            entry = self._groups.get(key)
+            if entry is None:
+                return
+            if not row_range or row_range[0] != entry["last_row"] + 1:
+                del self._groups[key]
+                return
+            for row_no, row in enumerate(rows, start=row_range[0]):
+                entry["rows"].append(self._entry(row_no, row))
+            entry["last_row"] = row_range[1]
+            entry["version"] += 1
+            self.stats["incremental_rows"] += len(rows)
+
+    def find(self, group, date, meal):
+        """
+        回傳 (版本, [(列號, 時間, 紀錄編號, 付款人), ...])；索引尚未建立時回傳 (None, [])
+        """
+        with self._lock:
+            entry = self._groups.get(self._normalize(group))
+            if entry is None:
+                return None, []
+            return entry["version"], [
+                (row_no, timestamp, record_id, payer) for row_no, timestamp, name, record_id, payer in entry["rows"]
+                if name == meal and date_key(timestamp) == date
+            ]
+
+    def others(self, group, exclude=()):
+        """
+        該團體其餘餐別列的 [(紀錄編號, 時間, 付款人), ...]，用來判斷舊資料的扣款能否唯一對應到某一筆餐別
+        """
+        exclude = set(exclude)
+        with self._lock:
+            entry = self._groups.get(self._normalize(group), {"rows": []})
+            return [(record_id, timestamp, payer) for row_no, timestamp, _, record_id, payer in entry["rows"]
+                    if row_no not in exclude]
+
+    def remove(self, group, version, row_numbers):
+        """
+        刪除後更新索引：後面的列號往前移。版本與規劃時不同（期間有其他寫入）則回傳 False
+        """
+        key = self._normalize(group)
+        removed = sorted(row_numbers)
+        with self._lock:
+            entry = self._groups.get(key)
+            if entry is None or entry["version"] != version:
+                self._groups.pop(key, None)
+                return False
+            kept = []
+            for row_no, *fields in entry["rows"]:
+                if row_no in row_numbers:
+                    continue
+                kept.append((row_no - bisect.bisect_left(removed, row_no), *fields))
+            entry["rows"] = kept
+            entry["last_row"] -= len(removed)
+            entry["version"] += 1
+            return True
+
+    def invalidate(self, group=None):
+        with self._lock:
+            if group is None:
+                self._groups.clear()
+            else:
+                self._groups.pop(self._normalize(group), None)
+
+
+def link_deductions(meals, other_meals, fund_entries, member_count):
+    """
+    找出要刪除的餐別對應的公費扣款：
+    - meals：要刪除的餐別 [(紀錄編號, 時間, 付款人), ...]
+    - other_meals：同團體其他餐別，格式相同
+    - fund_entries：同團體的扣款 [(列號或 id, 時間, 成員, 紀錄編號), ...]
+    - member_count：團體成員數
+    只有付款人為「系統」的餐別（分帳）有扣款；有紀錄編號的以編號對應。
+    舊資料沒有編號，且扣款與餐別列各自取時間（扣款先寫、餐別只到分鐘），以餐別前後一分鐘內沒有編號的扣款比對；
+    只有筆數等於成員數、每位成員各一筆，且這些扣款不落在其他舊餐別的時間範圍內時才採用，
+    否則不退還任何一筆，計入無法對應的餐別數，避免只退還部分成員。
+    回傳 (對應到的列號或 id, 無法對應扣款的餐別數)
+    """
+    by_record = {}
+    legacy = []
+    for ref, timestamp, member, record_id in fund_entries:
+        if record_id:
+            by_record.setdefault(record_id, []).append(ref)
+        else:
+            legacy.append((ref, parse_timestamp(timestamp), member))
+
+    def window(timestamp):
+        parsed = parse_timestamp(timestamp)
+        if parsed is None:
+            return None
+        minute = parsed.replace(second=0)
+        return minute - LEGACY_LINK_WINDOW, minute + LEGACY_LINK_WINDOW
+
+    legacy_windows = [window(timestamp) for record_id, timestamp, payer in list(meals) + list(other_meals)
+                      if not record_id and payer == SPLIT_PAYER]
+
+    linked = []
+    unlinked = 0
+    for record_id, timestamp, payer in meals:
+        if payer != SPLIT_PAYER:
+            continue  # 由成員代墊的紀錄沒有扣款
+        if record_id:
+            refs = by_record.get(record_id, [])
+            linked.extend(refs)
+            unlinked += 0 if refs else 1
+            continue
+        bounds = window(timestamp)
+        if bounds is None:
+            unlinked += 1
+            continue
+        candidates = [(ref, moment, member) for ref, moment, member in legacy
+                      if moment is not None and bounds[0] <= moment < bounds[1]]
+        shared = any(
+            other != bounds and other is not None and other[0] <= moment < other[1]
+            for _, moment, _ in candidates for other in legacy_windows
+        ) or legacy_windows.count(bounds) > 1
+        members = {member for _, _, member in candidates}
+        if shared or len(candidates) != member_count or len(members) != len(candidates):
+            unlinked += 1
+            continue
+        linked.extend(ref for ref, _, _ in candidates)
+    return linked, unlinked
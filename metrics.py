@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 預設的延遲分桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+# 指令總耗時超過此秒數時印出各階段耗時，0 表示關閉
+SLOW_COMMAND_SECONDS = float(os.getenv("SLOW_COMMAND_SECONDS", "0"))
+
+_lock = threading.Lock()
+_histograms = {}   # (名稱, labels) → {"buckets": [...], "sum": 秒, "count": 次數}
+_counters = {}     # (名稱, labels) → 數值
+_collectors = []   # 匯出時呼叫的函式，回傳 [(名稱, 類型, labels, 數值), ...]
+_local = threading.local()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    with _lock:
+        histogram = _histograms.get(_key(name, labels))
+        if histogram is None:
+            histogram = {"bounds": buckets, "buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            _histograms[_key(name, labels)] = histogram
+        for i, bound in enumerate(histogram["bounds"]):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def increment(name, amount=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+class CommandScope:
+    """
+    一次指令處理的各階段統計：{服務: {"calls", "seconds", "bytes_in", "bytes_out"}}
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.phases = {}
+
+    def phase(self, service):
+        return self.phases.setdefault(service, {"calls": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0})
+
+
+def current_scope():
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def command_scope(command):
+    """
+    量測一次指令從處理到回覆的總耗時，並彙總期間所有外部呼叫
+    """
+    scope = CommandScope(command)
+    previous = current_scope()
+    _local.scope = scope
+    start = time.perf_counter()
+    try:
+        yield scope
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.scope = previous
+        observe("linebot_command_seconds", elapsed, command=command)
+        for service, phase in scope.phases.items():
+            increment("linebot_external_calls_total", phase["calls"], command=command, service=service)
+            increment("linebot_external_bytes_total", phase["bytes_in"],
+                      command=command, service=service, direction="in")
+            increment("linebot_external_bytes_total", phase["bytes_out"],
+                      command=command, service=service, direction="out")
+        if SLOW_COMMAND_SECONDS and elapsed >= SLOW_COMMAND_SECONDS:
+            breakdown = ", ".join(
+                f"{service} {phase['seconds']:.2f}s/{phase['calls']} 次/"
+                f"{(phase['bytes_in'] + phase['bytes_out']) / 1024:.1f}KB"
+                for service, phase in scope.phases.items())
+            print(f"🐢 Slow command {command}: {elapsed:.2f}s ({breakdown or '無外部呼叫'})")
+
+
+@contextmanager
+def track(service, operation, count=True, bytes_out=0):
+    """
+    量測一次外部呼叫（或一組呼叫）的耗時；巢狀的同一服務只計算最外層，避免重複計時
+    """
+    active = getattr(_local, "active", None)
+    if active is None:
+        active = _local.active = set()
+    if service in active:
+        yield
+        return
+    active.add(service)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(service)
+        elapsed = time.perf_counter() - start
+        observe("linebot_external_call_seconds", elapsed, service=service, operation=operation)
+        scope = current_scope()
+        if scope is not None:
+            phase = scope.phase(service)
+            phase["seconds"] += elapsed
+            phase["bytes_out"] += bytes_out
+            if count:
+                phase["calls"] += 1
+
+
+def record_call(service, bytes_in=0, bytes_out=0):
+    """
+    記錄一次實際的外部請求（例如 HTTP 回應 hook），計入目前指令的呼叫次數與傳輸量
+    """
+    increment("linebot_external_requests_total", service=service)
+    scope = current_scope()
+    if scope is not None:
+        phase = scope.phase(service)
+        phase["calls"] += 1
+        phase["bytes_in"] += bytes_in
+        phase["bytes_out"] += bytes_out
+
+
+def snapshot():
+    """
+    回傳 (histograms, counters) 的複本，key 為 (名稱, ((label, 值), ...))
+    """
+    with _lock:
+        histograms = {k: dict(v, buckets=list(v["buckets"])) for k, v in _histograms.items()}
+        return histograms, dict(_counters)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render():
+    """
+    以 Prometheus 文字格式輸出所有指標
+    """
+    lines = []
+    histograms, counters = snapshot()
+
+    typed = set()
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        for bound, count in zip(histogram["bounds"], histogram["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for collector in _collectors:
+        for name, kind, labels, value in collector():
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
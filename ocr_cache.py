@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class OCRCache:
+    """
+    以圖片內容的 SHA-256 為 key 的本地磁碟快取，每筆一個 JSON 檔：
+    {"text": OCR 文字, "parser_version": 解析器版本, "parsed": 解析結果}
+    總大小超過 max_bytes 時，依最近使用時間淘汰最舊的項目（LRU）。
+    """
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key → 檔案大小，越後面越近期使用
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "parsed_hits": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    @staticmethod
+    def key(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            os.utime(self._path(key))
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key, entry):
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            tmp_path = f"{self._path(key)}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def record_parsed_hit(self):
+        with self._lock:
+            self.stats["parsed_hits"] += 1
+
+    def purge(self, parser_version=None):
+        """
+        刪除解析器版本不符的項目；parser_version 為 None 時清空整個快取
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if parser_version is not None:
+                    try:
+                        with open(self._path(key), encoding="utf-8") as f:
+                            if json.load(f).get("parser_version") == parser_version:
+                                continue
+                    except (OSError, ValueError):
+                        pass
+                self._remove(key)
+
+    def hit_rate(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return self.stats["hits"] / lookups if lookups else 0.0
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
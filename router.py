@@ -0,0 +1,73 @@
+import re
+
+
+class Command:
+    def __init__(self, name, handler, pattern=None, usage=""):
+        self.name = name
+        self.handler = handler
+        self.pattern = re.compile(pattern, re.DOTALL) if pattern else None
+        self.usage = usage
+
+
+class CommandRouter:
+    """
+    指令路由：以訊息的第一個詞查表（dict，O(1)），
+    指令與參數之間沒有空白時（例如「分帳大阪 ...」）改用前綴樹找出最長的指令名稱。
+    每個指令的參數格式是預先編譯好的正規表示式，格式不符時回覆該指令的用法說明。
+    """
+
+    def __init__(self, fallback):
+        self._commands = {}
+        self._trie = {}
+        self._fallback = fallback
+
+    def command(self, *names, pattern=None, usage=""):
+        """
+        註冊指令的 decorator；handler 會收到 context 與 pattern 擷取的群組
+        """
+        def decorator(handler):
+            for name in names:
+                self._commands[name] = Command(name, handler, pattern, usage)
+                node = self._trie
+                for char in name:
+                    node = node.setdefault(char, {})
+                node[None] = name
+            return handler
+        return decorator
+
+    def resolve(self, text):
+        """
+        回傳 (Command, 參數字串)；找不到指令時回傳 (None, text)
+        """
+        text = text.strip()
+        parts = text.split(None, 1)
+        if not parts:
+            return None, text
+        command = self._commands.get(parts[0]) or self._commands.get(parts[0].lower())
+        if command:
+            return command, parts[1] if len(parts) > 1 else ""
+
+        node, name = self._trie, None
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                name = node[None]
+        if name is None:
+            return None, text
+        return self._commands[name], text[len(name):].strip()
+
+    def dispatch(self, text, context=None):
+        command, args = self.resolve(text)
+        if command is None:
+            return self._fallback(text)
+
+        if command.pattern is not None:
+            match = command.pattern.fullmatch(args)
+            if not match:
+                return command.usage
+            args = match.groups()
+        else:
+            args = ()
+        return command.handler(context, *args)
@@ -0,0 +1,87 @@
+import heapq
+
+FUND_POOL = "公費"  # 公費帳戶本身，結算時退還剩餘公費或補足透支
+SYSTEM_PAYERS = ("", "系統", FUND_POOL)  # 由公費支付的餐別
+
+
+def distribute(total, members, adjustments=None):
+    """
+    將 total 扣除個人調整後平分給 members，餘數依成員順序各加 1 元，
+    確保每人金額加總剛好等於 total，多次分帳也不會累積誤差
+    """
+    adjustments = adjustments or {}
+    base_total = total - sum(adjustments.values())
+    share, remainder = divmod(base_total, len(members))
+    return {
+        m: share + (1 if i < remainder else 0) + adjustments.get(m, 0)
+        for i, m in enumerate(members)
+    }
+
+
+def net_balances(fund_balances, meal_rows=(), members=()):
+    """
+    彙總每位成員的淨額（單位：分），正數代表應收、負數代表應付。
+    - fund_balances：{成員: 公費餘額（元）}，即儲值減扣款，由儲存後端的餘額索引直接提供，不需逐列讀取
+    - 餐別列：[時間, 餐別, 金額, 付款人, ...]，以 pandas 向量化彙總，由成員代墊的餐費記為該成員應收
+    """
+    balances = {m: 0 for m in members}
+    for member, amount in fund_balances.items():
+        balances[member] = balances.get(member, 0) + int(round(float(amount) * 100))
+    if meal_rows:
+        import pandas as pd
+
+        meals = pd.DataFrame([list(r[:4]) + [""] * (4 - len(r[:4])) for r in meal_rows],
+                             columns=["timestamp", "meal", "amount", "payer"])
+        payer = meals["payer"].astype(str).str.strip()
+        paid_by_member = (~payer.isin(SYSTEM_PAYERS)).to_numpy()
+        paid = pd.DataFrame({
+            "member": payer[paid_by_member],
+            "cents": _to_cents(pd, meals["amount"])[paid_by_member],
+        })
+        for member, cents in paid.groupby("member", sort=False)["cents"].sum().items():
+            balances[member] = balances.get(member, 0) + int(cents)
+    return balances
+
+
+def _to_cents(pd, series):
+    values = pd.to_numeric(series.astype(str).str.replace(",", "", regex=False), errors="coerce")
+    return (values.fillna(0) * 100).round().astype("int64").to_numpy()
+
+
+def minimal_transfers(balances):
+    """
+    貪婪的最小現金流：每次由應付最多的人付給應收最多的人，每筆轉帳至少讓一方結清，
+    因此最多 n - 1 筆。balances 的總和必須為 0，回傳 [(付款人, 收款人, 金額), ...]
+    """
+    creditors = [(-amount, name) for name, amount in balances.items() if amount > 0]
+    debtors = [(amount, name) for name, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def settle(fund_balances, meal_rows=(), members=()):
+    """
+    回傳 (每位成員淨額, 轉帳清單)，金額單位為分。
+    成員淨額加總不為 0 時，差額由公費帳戶退還（剩餘公費）或補足（公費透支）。
+    """
+    balances = net_balances(fund_balances, meal_rows, members)
+    parties = dict(balances)
+    pool = -sum(parties.values())
+    if pool:
+        parties[FUND_POOL] = pool
+    return balances, minimal_transfers(parties)
+
+
+def format_cents(cents):
+    return f"{cents // 100}" if cents % 100 == 0 else f"{cents / 100:.2f}"
@@ -1,38 +1,436 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import pandas as pd
+import atexit
+import functools
+import os
+import random
 import re
-from datetime import datetime
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import metrics
+from ledger_journal import LedgerJournal
+from sheets_quota import BACKGROUND, QuotaLimiter, priority
+from event_queue import OrderedWorkerPool
+from balance_index import FUND_ID_COL, BalanceIndex, fund_record_id, row_checksum, signed_amount
+from meal_index import MEAL_ID_COL, SPLIT_PAYER, MealIndex, link_deductions, meal_adjustments, meal_record_id, new_record_id
+from storage import LedgerBackend, MirroredBackend, SQLiteBackend
+from settlement import distribute, format_cents, settle
 
 # ==== Google Sheets 認證與初始化 ====
 SPREADSHEET_ID = "1lC2baFstZ51E3iT_29N8KOfMoknrHMleSzTKx2emZ94"  # 請替換為實際 Spreadsheet ID
 scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-client = gspread.authorize(creds)
+creds = None
+client = None  # 第一次使用試算表時才載入 gspread 並認證，SQLite 模式完全不需要憑證
+
+# ==== Spreadsheet / Worksheet 連線快取（所有 gunicorn 執行緒共用）====
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # token 到期前多久先行更新
+
+# _cache_lock 只保護快取內容的讀寫，持有期間不做任何網路 I/O：
+# 配額限流可能讓一個請求等待數秒，若在鎖內等待，所有指令（包括快取命中）都會排在它後面
+_cache_lock = threading.RLock()
+_refresh_lock = threading.Lock()  # 同一時間只由一個執行緒更新 token
+_spreadsheet = None
+_worksheets = {}
+_call_state = threading.local()
+cache_stats = {"hits": 0, "misses": 0, "reconnects": 0}
+
+# 所有 Sheets 請求共用的配額限流（預設為每位使用者每分鐘 60 次讀取、60 次寫入）
+quota = QuotaLimiter(
+    read_per_minute=int(os.getenv("SHEETS_READ_PER_MINUTE", "60")),
+    write_per_minute=int(os.getenv("SHEETS_WRITE_PER_MINUTE", "60")),
+    max_retries=int(os.getenv("SHEETS_MAX_RETRIES", "5")),
+)
+
+def get_client():
+    global creds
+    if client is None:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        new_creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
+        new_client = gspread.authorize(new_creds)
+        with _cache_lock:
+            if client is None:
+                creds = new_creds
+                use_client(new_client)
+    return client
+
+def use_client(new_client):
+    """
+    改用指定的 client（例如離線量測用的假試算表），並掛上指標計數與配額限流
+    """
+    global client
+    with _cache_lock:
+        new_client.session.hooks["response"].append(_record_http_response)
+        quota.install(new_client.session)
+        client = new_client
+        invalidate_worksheet_cache()
+
+def _record_http_response(response, *args, **kwargs):
+    """
+    每個實際送出的 Sheets HTTP 請求都計入目前指令的呼叫次數與傳輸量
+    """
+    body = response.request.body or b""
+    metrics.record_call("sheets", bytes_in=len(response.content), bytes_out=len(body))
+
+def _needs_refresh(auth):
+    expiry = getattr(auth, "expiry", None)
+    return not auth.valid or (expiry and expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN)
+
+def _refresh_credentials():
+    auth = get_client().auth
+    if _needs_refresh(auth):
+        with _refresh_lock:
+            if _needs_refresh(auth):
+                from google.auth.transport.requests import Request
+                auth.refresh(Request())
+
+def get_spreadsheet():
+    """
+    快取未命中時在鎖外開啟試算表，再於鎖內確認是否已有其他執行緒先完成
+    """
+    global _spreadsheet
+    _refresh_credentials()
+    with _cache_lock:
+        spreadsheet = _spreadsheet
+        cache_stats["hits" if spreadsheet is not None else "misses"] += 1
+    if spreadsheet is not None:
+        return spreadsheet
+    opened = get_client().open_by_key(SPREADSHEET_ID)
+    with _cache_lock:
+        if _spreadsheet is None:
+            _spreadsheet = opened
+        return _spreadsheet
 
 def get_worksheet(name):
-    return client.open_by_key(SPREADSHEET_ID).worksheet(name)
+    with _cache_lock:
+        sheet = _worksheets.get(name)
+        cache_stats["hits" if sheet is not None else "misses"] += 1
+    if sheet is not None:
+        _refresh_credentials()
+        return sheet
+    fetched = get_spreadsheet().worksheet(name)
+    if name not in SYSTEM_SHEETS:
+        upgrade_meal_sheet(fetched)  # 每個行程只在分頁快取未命中時檢查一次
+    with _cache_lock:
+        return _worksheets.setdefault(name, fetched)
+
+def invalidate_worksheet_cache(name=None):
+    """
+    清除分頁快取；name 為 None 時連同 Spreadsheet 一起清除
+    """
+    global _spreadsheet
+    with _cache_lock:
+        if name is None:
+            _spreadsheet = None
+            _worksheets.clear()
+        else:
+            _worksheets.pop(name, None)
+
+def reconnect():
+    """
+    重新認證並清除所有快取的連線物件
+    """
+    global client
+    with _cache_lock:
+        client = None
+        invalidate_worksheet_cache()
+        cache_stats["reconnects"] += 1
+    get_client()
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+def sheets_call(func):
+    """
+    包裝對外的 Google Sheets 操作：
+    - 401：重新連線後重試一次（請求未被執行，重試安全）
+    - 5xx：重新連線後拋出，避免重複寫入
+    - 分頁不存在：清除快取後重試一次（分頁可能被手動刪除或改名）
+    巢狀呼叫只在最外層處理，避免重試次數疊加。
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_call_state, "active", False):
+            return func(*args, **kwargs)
+        _call_state.active = True
+        try:
+            with metrics.track("sheets", func.__name__, count=False):
+                return _call_with_retry(func, args, kwargs)
+        finally:
+            _call_state.active = False
+    return wrapper
+
+def _call_with_retry(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        if "gspread" not in sys.modules:  # 尚未使用過試算表，不會是 gspread 的錯誤
+            raise
+        from gspread.exceptions import APIError, WorksheetNotFound
+        if isinstance(e, WorksheetNotFound):
+            invalidate_worksheet_cache()
+            return func(*args, **kwargs)
+        if not isinstance(e, APIError):
+            raise
+        code = _status_code(e)
+        if code == 401:
+            reconnect()
+            return func(*args, **kwargs)
+        if code is not None and code >= 500:
+            reconnect()
+        raise
+
+# 團體分頁的標題列；不是團體分頁的系統分頁
+MEAL_HEADER = ["時間", "餐別", "金額", "付款人", "紀錄編號", "調整"]
+SYSTEM_SHEETS = ("groups", "group_funds", "group_records")
+
+def upgrade_meal_sheet(sheet):
+    """
+    舊版團體分頁的第 5 欄就是調整欄：補上「紀錄編號」欄，舊紀錄的調整往後移一欄。
+    以 updateCells 寫回依讀取內容算出的值而不是插入欄，多個 worker 同時升級也只會寫入相同內容
+    """
+    header = (sheet.get("A1:E1") or [[]])[0]
+    if header[:4] != MEAL_HEADER[:4] or header[MEAL_ID_COL:] == MEAL_HEADER[MEAL_ID_COL:MEAL_ID_COL + 1]:
+        return  # 不是團體分頁（例如備份分頁），或已經是新版欄位
+    values = sheet.get_all_values(value_render_option="UNFORMATTED_VALUE")
+    rows = [MEAL_HEADER[MEAL_ID_COL:]] + [[""] + row[MEAL_ID_COL:] if len(row) > MEAL_ID_COL else []
+                                             for row in values[1:]]
+    get_spreadsheet().batch_update({"requests": [{"updateCells": {
+        "rows": [{"values": [cell_data(v) for v in row]} for row in rows],
+        "fields": "userEnteredValue",
+        "start": {"sheetId": sheet.id, "rowIndex": 0, "columnIndex": MEAL_ID_COL},
+    }}]})
+    meal_index.invalidate(sheet.title)
+
+# ==== 團體成員快取 ====
+# 團體成員幾乎不會變動，快取整份團體清單，以正規化團名為 key；
+# 超過 TTL 後重新讀取，讓手動修改試算表的內容也能生效。
+GROUP_CACHE_TTL = int(os.getenv("GROUP_CACHE_TTL", "300"))  # 秒
+
+_group_index = {}
+_group_index_loaded_at = None
+# 重新讀取團體清單與新增團體依序執行（不持有 _cache_lock）；
+# 已有舊的清單時，其他執行緒不等待重新讀取，先沿用舊的清單
+_group_lock = threading.RLock()
+
+def normalize_group_name(group_name):
+    return str(group_name).strip().lower()
+
+def _group_index_fresh():
+    return (_group_index_loaded_at is not None
+            and time.monotonic() - _group_index_loaded_at < GROUP_CACHE_TTL)
+
+def _load_group_index():
+    global _group_index, _group_index_loaded_at
+    if _group_index_fresh():
+        return _group_index
+    if not _group_lock.acquire(blocking=_group_index_loaded_at is None):
+        return _group_index  # 其他執行緒正在重新讀取
+    try:
+        if _group_index_fresh():
+            return _group_index
+        index = get_backend().load_groups()
+        with _cache_lock:
+            _group_index = index
+            _group_index_loaded_at = time.monotonic()
+        return index
+    finally:
+        _group_lock.release()
+
+def invalidate_group_cache():
+    global _group_index_loaded_at
+    with _cache_lock:
+        _group_index_loaded_at = None
+
+# ==== 延遲寫入（write-behind）====
+# 開啟 WRITE_BEHIND=1 後，公費與餐別列先寫入本地日誌即回覆使用者，
+# 再由背景執行緒定期合併成 append_rows 批次寫入試算表。
+WRITE_BEHIND = os.getenv("WRITE_BEHIND") == "1"
+LEDGER_JOURNAL_PATH = os.getenv("LEDGER_JOURNAL_PATH", "ledger_journal.db")
+
+_journal = None
+
+# 補寫時檢查試算表最後幾列的紀錄編號，略過上次已寫入但未從日誌刪除的列
+JOURNAL_REPLAY_WINDOW = int(os.getenv("JOURNAL_REPLAY_WINDOW", "1000"))
+
+@sheets_call
+def _flush_journal_rows(sheet_name, rows, replay=False):
+    """
+    以呼叫端的優先順序寫出：背景執行緒以 BACKGROUND 呼叫，查詢前由使用者的指令補寫則與指令同樣優先
+    """
+    if replay:
+        rows = _unwritten_rows(sheet_name, rows)
+    if rows:
+        append_sheet_rows(sheet_name, rows)
+
+def _unwritten_rows(sheet_name, rows):
+    """
+    回傳紀錄編號不在分頁最後 len(rows) + JOURNAL_REPLAY_WINDOW 列中的列；
+    同一個指令的列在同一次 append 寫入同一個分頁，只要編號出現就代表整批都已寫入
+    """
+    if sheet_name == "group_funds":
+        sheet, last_row, id_col = ensure_fund_index(), balance_index.last_row, "F"
+    else:
+        sheet, last_row, id_col = ensure_meal_index(sheet_name), meal_index.last_row(sheet_name), "E"
+    if last_row < 2:
+        return rows  # 只有標題列
+    first = max(2, last_row - len(rows) - JOURNAL_REPLAY_WINDOW)
+    written = {str(cell).strip() for row in sheet.get(f"{id_col}{first}:{id_col}{last_row}") for cell in row}
+    id_index = FUND_ID_COL if sheet_name == "group_funds" else MEAL_ID_COL
+    return [row for row in rows if len(row) <= id_index or not row[id_index] or row[id_index] not in written]
+
+def get_journal():
+    global _journal
+    with _cache_lock:
+        if _journal is None:
+            _journal = LedgerJournal(
+                LEDGER_JOURNAL_PATH,
+                _flush_journal_rows,
+                flush_interval=float(os.getenv("JOURNAL_FLUSH_INTERVAL", "5")),
+                flush_size=int(os.getenv("JOURNAL_FLUSH_SIZE", "200")),
+                background=lambda: priority(BACKGROUND),  # 補寫不急，配額優先留給使用者指令
+            )
+            _journal.start()  # 啟動時會先補寫上次未寫出的列
+            atexit.register(_journal.close)
+        return _journal
+
+def append_sheet_rows(sheet_name, rows):
+    """
+    所有寫入試算表的 append 都經過這裡，寫入 group_funds 時同步更新餘額索引，寫入團體分頁時更新餐別索引
+    """
+    response = get_worksheet(sheet_name).append_rows(rows)
+    if sheet_name == "group_funds":
+        balance_index.apply(rows, updated_row_range(response))
+    else:
+        meal_index.apply(sheet_name, rows, updated_row_range(response))
+    return response
+
+def cell_data(value):
+    """
+    appendCells 的儲存格內容；與 append_rows 預設的 RAW 模式相同，字串不會被解析成日期或數字
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None else str(value)}}
+
+def append_cells_request(sheet_id, rows):
+    return {"appendCells": {
+        "sheetId": sheet_id,
+        "rows": [{"values": [cell_data(v) for v in row]} for row in rows],
+        "fields": "userEnteredValue",
+    }}
+
+def append_rows_together(batches):
+    """
+    batches: [(分頁名稱, [列, ...]), ...]
+    以一次 batch_update（每個分頁一個 appendCells）寫入，所有分頁一起成功或一起失敗。
+    appendCells 的回應沒有寫入的列號，改由索引的最後一列推算；
+    若同時有其他寫入者讓推算錯誤，索引會在下次比對時發現並重建。
+    """
+    requests = [append_cells_request(get_worksheet(name).id, rows) for name, rows in batches]
+    ranges = {
+        name: (balance_index.next_range(len(rows)) if name == "group_funds"
+               else meal_index.next_range(name, len(rows)))
+        for name, rows in batches
+    }
+    try:
+        get_spreadsheet().batch_update({"requests": requests})
+    except Exception:
+        # 5xx 時請求可能已經生效，捨棄索引，下次使用時重新讀取
+        for name, _ in batches:
+            _invalidate_index(name)
+        raise
+    for name, rows in batches:
+        if name == "group_funds":
+            balance_index.apply(rows, ranges[name])
+        else:
+            meal_index.apply(name, rows, ranges[name])
+
+def _invalidate_index(sheet_name):
+    if sheet_name == "group_funds":
+        balance_index.invalidate()
+    else:
+        meal_index.invalidate(sheet_name)
+
+# ==== 公費餘額索引 ====
+balance_index = BalanceIndex(normalize=normalize_group_name)
+meal_index = MealIndex(normalize=normalize_group_name)
+
+def ensure_fund_index():
+    """
+    以開放結尾的範圍讀取索引最後一列之後的內容：多出來的列代表有其他寫入者，需要重建。
+    範圍不能超出分頁的格線，若最後一列已被手動刪除而超出格線，Sheets 回 400，同樣重建。
+    """
+    sheet = get_worksheet("group_funds")
+    tail = []
+    if balance_index.loaded:
+        try:
+            tail = sheet.get(f"A{balance_index.last_row}:F")
+        except Exception as e:
+            if _status_code(e) != 400:
+                raise
+    if not balance_index.verify(tail):
+        balance_index.rebuild(sheet.get_all_values())
+    return sheet
+
+def ensure_meal_index(group):
+    """
+    與 ensure_fund_index 相同，以開放結尾的範圍讀取餐別索引最後一列之後的內容，
+    多出列（其他 worker 寫入）或內容不符（手動編輯）時重新讀取該團體分頁的前五欄
+    """
+    sheet = get_worksheet(group)
+    tail = []
+    last_row = meal_index.last_row(group)
+    if last_row is not None:
+        try:
+            tail = sheet.get(f"A{last_row}:E")
+        except Exception as e:
+            if _status_code(e) != 400:
+                raise
+    if not meal_index.verify(group, tail):
+        meal_index.load(group, sheet.get("A2:E"))
+    return sheet
+
+@sheets_call
+def get_group_fund_balances(group_name):
+    """
+    回傳 {成員: 餘額}，尚未有紀錄的成員為 0
+    """
+    members = get_group_members(group_name)
+    balances = {m: 0 for m in members}
+    for name, amount in get_backend().fund_balances(group_name).items():
+        balances[name] = balances.get(name, 0) + amount
+    return balances
+
+@sheets_call
+def format_group_fund_balance_report(group_name):
+    balances = get_group_fund_balances(group_name)
+    return (f"💰【{group_name}】公費餘額：\n"
+            f"{format_group_fund_balance(balances)}\n\n"
+            f"{suggest_group_fund_topup(balances)}")
 
 # ==== 團體記帳功能 ====
 
+@sheets_call
 def create_group(group_name, members):
-    group_sheet = get_worksheet("groups")
-    existing = group_sheet.col_values(1)
-    if group_name in existing:
-        return False
-    group_sheet.append_row([group_name, ",".join(members)])
-    sheet = client.open_by_key(SPREADSHEET_ID)
-    sheet.add_worksheet(title=group_name, rows="1000", cols="10")
+    with _group_lock:
+        if normalize_group_name(group_name) in _load_group_index():
+            return False
+        if not get_backend().add_group(group_name, members):
+            return False
+        with _cache_lock:
+            _group_index[normalize_group_name(group_name)] = list(members)
     return True
 
+@sheets_call
 def get_group_members(group_name):
-    group_sheet = get_worksheet("groups")
-    records = group_sheet.get_all_records()
-    for r in records:
-        if r['group_name'].strip().lower() == group_name.strip().lower():
-            return [name.strip() for name in r['members'].split(',') if name.strip()]
-    raise Exception(f"找不到團體：{group_name}")
+    members = _load_group_index().get(normalize_group_name(group_name))
+    if members is None:
+        raise Exception(f"找不到團體：{group_name}")
+    return list(members)
 
+@sheets_call
 def split_group_expense(group, meal, total_amount, adjustments_list):
     members = get_group_members(group)
     if not members:
@@ -49,98 +447,266 @@ def split_group_expense(group, meal, total_amount, adjustments_list):
             return f"⚠️ 成員 {name} 不在團體中"
         adjustments[name] = int(offset)
 
-    base_total = total_amount - sum(adjustments.values())
-    share = base_total // len(members)
-    final = {m: share + adjustments.get(m, 0) for m in members}
-    for name, amt in final.items():
-        append_group_fund_record(group, name, amt, 'deduct')
-
-    append_group_record(group, meal, total_amount, '系統', adjustments)
+    share = (total_amount - sum(adjustments.values())) // len(members)
+    final = distribute(total_amount, members, adjustments)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # 餐別列與扣款列記錄同一個紀錄編號，刪除餐別時以此找出對應的扣款
+    record_id = new_record_id()
+    fund_rows = [[group, name, now, amt, 'deduct', record_id] for name, amt in final.items()]
+    meal_row = build_group_record_row(meal, total_amount, SPLIT_PAYER, adjustments, now, record_id)
+    get_backend().append_records(group, [meal_row], fund_rows)
     return f"✅ 分帳完成：每人約 {share} 元，已記入扣款"
 
+def build_group_record_row(meal, amount, payer, adjustments, now=None, record_id=None):
+    now = now or datetime.now().strftime("%Y-%m-%d %H:%M")
+    return [now, meal, amount, payer, record_id or new_record_id()] + [f"{k}{v:+}" for k, v in adjustments.items()]
+
+@sheets_call
 def append_group_record(group, meal, amount, payer, adjustments):
-    sheet = get_worksheet(group)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M")
-    row = [now, meal, amount, payer] + [f"{k}{v:+}" for k, v in adjustments.items()]
-    sheet.append_row(row)
+    get_backend().append_records(group, [build_group_record_row(meal, amount, payer, adjustments)], [])
 
-def get_group_records(group):
-    sheet = get_worksheet(group)
-    df = pd.DataFrame(sheet.get_all_records())
-    if df.empty:
+def updated_row_range(response):
+    """
+    從 append_rows 的回應取出實際寫入的列號範圍 (起始列, 結束列)
+    """
+    updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+    match = re.search(r'![A-Z]+(\d+)(?::[A-Z]+(\d+))?$', updated_range)
+    if not match:
+        return None
+    start = int(match.group(1))
+    return start, int(match.group(2) or start)
+
+# ==== 分頁查詢 ====
+HISTORY_PAGE_SIZE = 20
+
+def _date_key(value):
+    return str(value).strip()[:10].replace("/", "-")
+
+def select_history_rows(entries, last=None, page=None, start=None, end=None):
+    """
+    entries: [(列號, 時間), ...]，依寫入順序排列
+    回傳 (選到的列號, 符合筆數, 頁碼, 總頁數)；第 1 頁為最新的一頁
+    """
+    if start or end:
+        start_key = _date_key(start) if start else ""
+        end_key = _date_key(end) if end else "9999-99-99"
+        entries = [(r, t) for r, t in entries if start_key <= _date_key(t) <= end_key]
+    total = len(entries)
+    if last:
+        return [r for r, _ in entries[-last:]], total, 1, 1
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    page = min(max(page or 1, 1), pages)
+    stop = total - (page - 1) * HISTORY_PAGE_SIZE
+    begin = max(0, stop - HISTORY_PAGE_SIZE)
+    return [r for r, _ in entries[begin:stop]], total, page, pages
+
+def row_spans(row_numbers):
+    """
+    將遞增的列號合併成連續區段，例如 [2, 3, 4, 9] → [(2, 4), (9, 9)]
+    """
+    spans = []
+    for row in row_numbers:
+        if spans and row == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], row)
+        else:
+            spans.append((row, row))
+    return spans
+
+def row_ranges(row_numbers, last_col):
+    """
+    將列號轉成 A1 範圍，例如 [2, 3, 4, 9] → ['A2:E4', 'A9:E9']
+    """
+    return [f"A{start}:{last_col}{end}" for start, end in row_spans(row_numbers)]
+
+# batch_get 以 GET 送出，每個範圍都放在網址中；範圍太多（例如在共用的 group_funds 中交錯的列）會超過網址長度上限
+BATCH_GET_MAX_RANGES = 100
+
+def fetch_rows(sheet, row_numbers, last_col, **kwargs):
+    """
+    以 batch_get 只讀取指定的列，每次最多 BATCH_GET_MAX_RANGES 個範圍；
+    kwargs 直接交給 batch_get（例如 value_render_option）
+    """
+    if not row_numbers:
+        return []
+    ranges = row_ranges(row_numbers, last_col)
+    rows = []
+    for begin in range(0, len(ranges), BATCH_GET_MAX_RANGES):
+        for value_range in sheet.batch_get(ranges[begin:begin + BATCH_GET_MAX_RANGES], **kwargs):
+            rows.extend(value_range)
+    return rows
+
+def _page_footer(total, page, pages, last):
+    if last:
+        return f"（最近 {min(last, total)} 筆，共 {total} 筆）"
+    return f"（第 {page}/{pages} 頁，共 {total} 筆）"
+
+@sheets_call
+def get_group_records(group, last=None, page=None, start=None, end=None):
+    rows, total, page, pages = get_backend().meal_history(group, last, page, start, end)
+    if not rows:
         return "⚠️ 尚未有任何記錄"
-    df_str = df.to_string(index=False)
-    return f"📊【{group}】團體記帳記錄：\n{df_str}"
+    lines = [f"📊【{group}】團體記帳記錄："]
+    for row in rows:
+        lines.append(" ".join(str(v) for v in list(row[:4]) + meal_adjustments(row) if str(v).strip()))
+    lines.append(_page_footer(total, page, pages, last))
+    return "\n".join(lines)
 
+@sheets_call
 def delete_group_meal(group, date_str, meal_name):
-    sheet = get_worksheet(group)
-    records = sheet.get_all_records()
-    for idx, r in enumerate(records):
-        record_date = r.get("時間", "")[:10]
-        if record_date == date_str and r.get("餐別") == meal_name:
-            sheet.delete_rows(idx + 2)  # +2 是因為 get_all_records() 從第2列開始
-            return f"✅ 已刪除 {date_str} 的 {meal_name} 記錄"
-    return f"⚠️ 找不到 {date_str} 的 {meal_name} 記錄"
+    result = get_backend().delete_meal(group, _date_key(date_str), meal_name)
+    if result is None:
+        return f"⚠️ 找不到 {date_str} 的 {meal_name} 記錄"
+    lines = [f"✅ 已刪除 {date_str} 的 {meal_name} 記錄（{result['meals']} 筆）"]
+    if result["refunds"]:
+        lines.append("💰 已退還公費：" + "、".join(
+            f"{name} +{amount}" for name, amount in result["refunds"].items()))
+    if result["unlinked"]:
+        lines.append(f"⚠️ 有 {result['unlinked']} 筆餐別無法確定對應的扣款，未退還公費，請以「查詢公費紀錄」確認")
+    return "\n".join(lines)
 
-def top_up_group_fund(group_name, records: dict):
+@sheets_call
+def top_up_group_fund(group_name, amount=None, contributions=None):
     """
-    儲值團體公費，records 是 dict 格式：{ '小明': 300, '小花': 200 }
+    儲值團體公費：
+    - amount：總金額，平均分給所有成員（餘數依成員順序各加 1 元）
+    - contributions：個人儲值明細，例如 ['小明+300', '小花+200']
     """
-    sheet = get_worksheet('group_funds')
+    members = get_group_members(group_name)
+    records = {}
+    if contributions:
+        for item in contributions:
+            match = re.match(r'(\D+)\+(\d+)$', item)
+            if not match:
+                return f"⚠️ 格式錯誤：{item}，請使用『人名+金額』格式"
+            name, value = match.groups()
+            if name not in members:
+                return f"⚠️ 成員 {name} 不在團體中"
+            records[name] = records.get(name, 0) + int(value)
+    elif amount:
+        share, remainder = divmod(int(amount), len(members))
+        records = {m: share + (1 if i < remainder else 0) for i, m in enumerate(members)}
+    else:
+        return "❗請提供總金額或個人儲值明細"
+
     today = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    for name, amount in records.items():
-        sheet.append_row([group_name, name, today, amount, '儲值'])
+    record_id = new_record_id()
+    get_backend().append_records(
+        group_name, [], [[group_name, name, today, value, '儲值', record_id] for name, value in records.items()])
     return f"✅ 已為 {group_name} 儲值公費：{', '.join([f'{k}+{v}' for k, v in records.items()])}"
 
-def format_group_fund_history(group_name):
-    sheet = get_worksheet('group_funds')
-    records = sheet.get_all_records()
-    filtered = [r for r in records if r['group_name'] == group_name]
+@sheets_call
+def format_group_fund_history(group_name, last=None, page=None, start=None, end=None):
+    rows, total, page, pages = get_backend().fund_history(group_name, last, page, start, end)
 
-    if not filtered:
+    if not rows:
         return f"⚠️ 找不到 {group_name} 的公費紀錄"
 
     lines = [f"📜【{group_name}】公費紀錄："]
-    for r in filtered:
-        time = r.get('timestamp') or r.get('time') or ''
-        action = "儲值" if r['type'] == '儲值' else "扣款"
-        lines.append(f"{time} - {r['member']} {action} {r['amount']} 元")
+    for r in rows:
+        r = list(r) + [""] * (5 - len(r))
+        action = "儲值" if r[4] == '儲值' else "扣款"
+        lines.append(f"{r[2]} - {r[1]} {action} {r[3]} 元")
+    lines.append(_page_footer(total, page, pages, last))
 
     return "\n".join(lines)
 
+# ==== 結算 ====
+
+@sheets_call
+def format_group_settlement(group_name):
+    """
+    以公費餘額索引加上由成員代墊的餐別列算出每人淨額，列出最少筆數的轉帳方式；
+    公費列不需逐列讀取，餐別列以分頁的範圍讀取
+    """
+    members = get_group_members(group_name)
+    backend = get_backend()
+    meal_rows = [row for rows in backend.iter_meal_rows(group_name) for row in rows]
+    balances, transfers = settle(backend.fund_balances(group_name), meal_rows, members)
+
+    lines = [f"💸【{group_name}】結算："]
+    for name, cents in balances.items():
+        lines.append(f"{name}：{'應收' if cents >= 0 else '應付'} {format_cents(abs(cents))} 元")
+    lines.append("")
+    if not transfers:
+        lines.append("所有人都已結清 🎉")
+    for payer, payee, cents in transfers:
+        lines.append(f"{payer} → {payee}：{format_cents(cents)} 元")
+    return "\n".join(lines)
+
+# ==== 重設與備份 ====
+
+def delete_rows_request(sheet_id, start, end):
+    """
+    batch_update 的刪除列請求；start、end 為含頭尾的 1-based 列號
+    """
+    return {"deleteDimension": {"range": {
+        "sheetId": sheet_id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+    }}}
+
+# 每次重設把該團體被刪除的列存成一個備份分頁（第一欄為來源分頁），每個團體只保留最近幾份
+RESET_BACKUP_KEEP = max(1, int(os.getenv("RESET_BACKUP_KEEP", "3")))
+BACKUP_HEADER = ["來源分頁", "列內容"]
+
+def backup_requests(group_name, rows_by_sheet):
+    """
+    rows_by_sheet: [(分頁名稱, [列, ...]), ...]
+    回傳 (備份分頁名稱, 請求)：新增備份分頁、寫入各列、刪除該團體超過保留份數的舊備份。
+    請求與刪除列的請求放在同一個 batch_update，備份與刪除一起成功或一起失敗。
+    """
+    sheets = get_spreadsheet().worksheets()
+    titles = {sheet.title for sheet in sheets}
+    base = f"備份_{group_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    title, n = base, 1
+    while title in titles:  # 同一秒內重設兩次
+        n += 1
+        title = f"{base}_{n}"
+    pattern = re.compile(rf"備份_{re.escape(group_name)}_\d{{14}}(_\d+)?$")
+    old_backups = sorted((sheet for sheet in sheets if pattern.match(sheet.title)), key=lambda sheet: sheet.title)
+    used_ids = {sheet.id for sheet in sheets}
+    sheet_id = random.randrange(1, 2 ** 31)
+    while sheet_id in used_ids:
+        sheet_id = random.randrange(1, 2 ** 31)
+
+    rows = [BACKUP_HEADER] + [[name] + list(row) for name, sheet_rows in rows_by_sheet
+                              for row in sheet_rows if any(str(v).strip() for v in row)]
+    requests = [
+        {"addSheet": {"properties": {
+            "sheetId": sheet_id, "title": title,
+            "gridProperties": {"rowCount": len(rows), "columnCount": max(len(row) for row in rows)},
+        }}},
+        append_cells_request(sheet_id, rows),
+    ]
+    expired = old_backups[:max(0, len(old_backups) - (RESET_BACKUP_KEEP - 1))]
+    requests += [{"deleteSheet": {"sheetId": sheet.id}} for sheet in expired]
+    return title, requests
+
+@sheets_call
+def restore_backup(backup_title):
+    """
+    把重設備份中的列接回各分頁目前資料之後，並刪除該備份分頁；以一次 batch_update 完成，
+    重設之後其他團體（或該團體）新寫入的列都會保留。回傳 {分頁名稱: 加回的列數}
+    """
+    spreadsheet = get_spreadsheet()
+    backup = spreadsheet.worksheet(backup_title)
+    rows_by_sheet = {}
+    for row in backup.get_all_values(value_render_option="UNFORMATTED_VALUE")[1:]:
+        cells = list(row[1:])
+        while cells and cells[-1] == "":
+            cells.pop()
+        rows_by_sheet.setdefault(row[0], []).append(cells)
+    requests = [append_cells_request(get_worksheet(name).id, rows) for name, rows in rows_by_sheet.items()]
+    requests.append({"deleteSheet": {"sheetId": backup.id}})
+    spreadsheet.batch_update({"requests": requests})
+    balance_index.invalidate()
+    meal_index.invalidate()
+    return {name: len(rows) for name, rows in rows_by_sheet.items()}
+
+@sheets_call
 def reset_group_records(group_name):
-    group_sheet = get_worksheet("group_records")
-    records = group_sheet.get_all_records()
-    new_records = [r for r in records if r["group_name"] != group_name]
-
-    group_sheet.clear()
-    group_sheet.append_row(["timestamp", "group_name", "meal", "total", "split", "remark"])
-    for r in new_records:
-        group_sheet.append_row([
-            r["timestamp"],
-            r["group_name"],
-            r["meal"],
-            r["total"],
-            r["split"],
-            r.get("remark", ""),
-        ])
-
-    fund_sheet = get_worksheet("group_funds")
-    fund_records = fund_sheet.get_all_records()
-    new_fund_records = [r for r in fund_records if r["group_name"] != group_name]
-
-    fund_sheet.clear()
-    fund_sheet.append_row(["timestamp", "group_name", "member", "type", "amount"])
-    for r in new_fund_records:
-        fund_sheet.append_row([
-            r["timestamp"],
-            r["group_name"],
-            r["member"],
-            r["type"],
-            r["amount"]
-        ])
-
-    return f"✅ 已重設【{group_name}】的所有團體記帳與公費紀錄"
+    backups = get_backend().reset_group(group_name)
+    if not backups:
+        return f"⚠️ 【{group_name}】沒有可重設的紀錄"
+    return f"✅ 已重設【{group_name}】的所有團體記帳與公費紀錄（備份：{'、'.join(backups.values())}）"
 
 def format_group_fund_balance(balances):
     result_lines = []
@@ -161,11 +727,351 @@ def suggest_group_fund_topup(balances, target_balance=1000):
         return "所有成員的公費皆已達標 🎉"
     return "💡 儲值建議：\n" + "\n".join(suggestions)
 
+@sheets_call
 def append_group_fund_record(group_name, member, amount, action_type):
     """
     將儲值或扣款紀錄新增到 group_funds 分頁。
     action_type: '儲值' 或 'deduct'
     """
-    sheet = get_worksheet("group_funds")
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    sheet.append_row([group_name, member, now, amount, action_type])
+    get_backend().append_records(group_name, [], [[group_name, member, now, amount, action_type, new_record_id()]])
+
+# ==== 儲存後端 ====
+# STORAGE_BACKEND=sheets（預設）直接讀寫 Google Sheets；
+# STORAGE_BACKEND=sqlite 使用本地 SQLite，再設定 SHEETS_MIRROR=1 可同步一份到試算表。
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "ledger.db")
+SHEETS_MIRROR = os.getenv("SHEETS_MIRROR") == "1"
+
+class SheetsBackend(LedgerBackend):
+    """
+    以 Google Sheets 為儲存：groups、group_funds 與每個團體一個餐別分頁
+    """
+
+    def load_groups(self):
+        index = {}
+        for r in get_worksheet("groups").get_all_records():
+            key = normalize_group_name(r['group_name'])
+            if key and key not in index:
+                index[key] = [name.strip() for name in str(r['members']).split(',') if name.strip()]
+        return index
+
+    def add_group(self, group_name, members):
+        get_worksheet("groups").append_row([group_name, ",".join(members)])
+        new_sheet = get_spreadsheet().add_worksheet(title=group_name, rows="1000", cols="10")
+        new_sheet.append_row(MEAL_HEADER)
+        with _cache_lock:
+            _worksheets[group_name] = new_sheet
+        return True
+
+    def append_records(self, group, meal_rows, fund_rows):
+        """
+        只寫一個分頁時呼叫一次 append_rows；餐別列與公費列都有時以一次 batch_update 寫入兩個分頁，
+        不會只扣到部分成員或只留下餐別列。
+        延遲寫入模式下兩個分頁的列在同一個本地交易中寫入日誌。
+        """
+        batches = [(name, rows) for name, rows in (("group_funds", fund_rows), (group, meal_rows)) if rows]
+        if WRITE_BEHIND:
+            get_journal().append(batches)
+            return
+        if len(batches) > 1:
+            append_rows_together(batches)
+            return
+        for sheet_name, rows in batches:
+            append_sheet_rows(sheet_name, rows)
+
+    def fund_balances(self, group):
+        """
+        索引與試算表一致時只需讀取兩列；冷啟動或被手動修改時才重新讀取整張 group_funds
+        """
+        ensure_fund_index()
+        balances = balance_index.balances(group)
+        if WRITE_BEHIND:
+            for _, row in get_journal().pending_rows("group_funds"):
+                if normalize_group_name(row[0]) == normalize_group_name(group):
+                    balances[row[1]] = balances.get(row[1], 0) + signed_amount(row)
+        return balances
+
+    def _flush_pending(self):
+        """
+        延遲寫入模式下，查詢紀錄前先寫出日誌中的列，讓紀錄、結算與餘額一致
+        """
+        if WRITE_BEHIND:
+            get_journal().flush()
+
+    def meal_history(self, group, last=None, page=None, start=None, end=None):
+        self._flush_pending()
+        sheet = ensure_meal_index(group)
+        entries = meal_index.rows(group)
+        row_numbers, total, page, pages = select_history_rows(entries, last, page, start, end)
+        return fetch_rows(sheet, row_numbers, "J"), total, page, pages
+
+    def fund_history(self, group, last=None, page=None, start=None, end=None):
+        self._flush_pending()
+        sheet = ensure_fund_index()
+        entries = balance_index.rows(group)
+        row_numbers, total, page, pages = select_history_rows(entries, last, page, start, end)
+        return fetch_rows(sheet, row_numbers, "E"), total, page, pages
+
+    def iter_meal_rows(self, group, page_size=1000):
+        """
+        每次以範圍讀取 page_size 列，讀到不滿一頁或格線結尾即結束。
+        範圍不能超出格線，快取的分頁物件在 append 後列數不會更新，因此先重新讀取一次分頁的格線列數。
+        """
+        self._flush_pending()
+        sheet = get_worksheet(group)
+        row_count = get_spreadsheet().worksheet(group).row_count
+        start = 2
+        while start <= row_count:
+            values = sheet.get(f"A{start}:J{min(start + page_size - 1, row_count)}")
+            rows = [row for row in values if any(str(v).strip() for v in row)]
+            if rows:
+                yield rows
+            if len(values) < page_size:
+                return
+            start += page_size
+
+    def iter_fund_rows(self, group, page_size=1000):
+        """
+        由餘額索引取得該團體的第一列與最後一列，其間以連續範圍每次讀取 page_size 列再依團名篩選。
+        團體的列分散在其他團體之間時，逐列 batch_get 每次最多只能帶 BATCH_GET_MAX_RANGES 個範圍，
+        請求數會隨列數增加；連續範圍的請求數只與涵蓋的列數有關
+        """
+        self._flush_pending()
+        sheet = ensure_fund_index()
+        row_numbers = [row for row, _ in balance_index.rows(group)]
+        if not row_numbers:
+            return
+        key = normalize_group_name(group)
+        first, last = row_numbers[0], row_numbers[-1]
+        for start in range(first, last + 1, page_size):
+            values = sheet.get(f"A{start}:F{min(start + page_size - 1, last)}")
+            rows = [row for row in values if row and normalize_group_name(str(row[0])) == key]
+            if rows:
+                yield rows
+
+    def delete_meal(self, group, date_str, meal_name):
+        """
+        由餐別索引找出該日期所有同名餐別的列，連同對應的公費扣款以一次 batch_update 刪除
+        （同一個 batch_update 內的請求一起成功或一起失敗）。
+        送出前以一次 batch_get 讀回要刪除的列，內容與索引不符（例如有人手動編輯）就重建索引再試一次；
+        同一個行程內的刪除與重設以鎖排隊，避免彼此的列號位移。
+        """
+        with _delete_lock:
+            self._flush_pending()  # 尚未寫出的列也要能被刪除
+            for _ in range(2):
+                plan = self._plan_meal_delete(group, date_str, meal_name)
+                if plan is None:
+                    return None
+                if plan is False:
+                    meal_index.invalidate(group)
+                    balance_index.invalidate()
+                    continue
+                return self._apply_meal_delete(group, plan)
+        raise Exception("紀錄在刪除過程中被修改，請稍後再試")
+
+    def _plan_meal_delete(self, group, date_str, meal_name):
+        """
+        回傳刪除計畫；找不到餐別時回傳 None，試算表內容與索引不一致時回傳 False
+        """
+        sheet = ensure_meal_index(group)
+        version, meal_rows = meal_index.find(group, date_str, meal_name)
+        if not meal_rows:
+            return None
+        meal_numbers = [row_no for row_no, *_ in meal_rows]
+        current = fetch_rows(sheet, meal_numbers, "E")
+        expected = [(timestamp, meal_name, record_id) for _, timestamp, record_id, _ in meal_rows]
+        if [(str(row[0]).strip(), str(row[1]).strip(), meal_record_id(row)) for row in current] != expected:
+            return False
+
+        fund_sheet = ensure_fund_index()
+        fund_entries = balance_index.deductions(group)
+        linked, unlinked = link_deductions(
+            [(record_id, timestamp, payer) for _, timestamp, record_id, payer in meal_rows],
+            meal_index.others(group, exclude=meal_numbers),
+            fund_entries,
+            len(get_group_members(group)),
+        )
+        fund_values = fetch_rows(fund_sheet, linked, "F")
+        indexed = {row_no: (member, record_id) for row_no, _, member, record_id in fund_entries}
+        if len(fund_values) != len(linked) or any(
+                normalize_group_name(row[0]) != normalize_group_name(group)
+                or (str(row[1]).strip(), fund_record_id(row)) != indexed[row_no]
+                for row_no, row in zip(linked, fund_values)):
+            return False
+        return {
+            "version": version,
+            "sheet": sheet,
+            "meal_numbers": meal_numbers,
+            "fund_sheet": fund_sheet,
+            "deductions": dict(zip(linked, fund_values)),
+            "unlinked": unlinked,
+        }
+
+    def _apply_meal_delete(self, group, plan):
+        requests = [delete_rows_request(plan["sheet"].id, start, end)
+                    for start, end in reversed(row_spans(plan["meal_numbers"]))]
+        requests += [delete_rows_request(plan["fund_sheet"].id, start, end)
+                     for start, end in reversed(row_spans(sorted(plan["deductions"])))]
+        get_spreadsheet().batch_update({"requests": requests})
+
+        meal_index.remove(group, plan["version"], set(plan["meal_numbers"]))
+        balance_index.remove(plan["deductions"])
+        refunds = {}
+        for row in plan["deductions"].values():
+            member = str(row[1]).strip()
+            refunds[member] = refunds.get(member, 0) - signed_amount(row)
+        return {"meals": len(plan["meal_numbers"]), "refunds": refunds, "unlinked": plan["unlinked"]}
+
+    def reset_group(self, group):
+        """
+        以單一 batch_update 新增只含該團體列的備份分頁，並刪除該團體在各分頁的列。
+        batch_update 內的請求會一起成功或一起失敗，其他團體的資料不會因中途失敗而遺失。
+        """
+        with _delete_lock:
+            return self._reset_group(group)
+
+    def _group_fund_rows(self, group, **kwargs):
+        """
+        由餘額索引取得該團體在 group_funds 的列號並讀回內容。
+        手動排序或就地編輯時列數與最後一列可能不變，索引檢查不出來，
+        因此逐列確認團名；有任何一列不符就重建索引再讀一次，仍不符則中止
+        """
+        key = normalize_group_name(group)
+        for _ in range(2):
+            sheet = ensure_fund_index()
+            numbers = [row for row, _ in balance_index.rows(group)]
+            rows = fetch_rows(sheet, numbers, "F", **kwargs)
+            if len(rows) == len(numbers) and all(
+                    row and normalize_group_name(str(row[0])) == key for row in rows):
+                return sheet, numbers, rows
+            balance_index.invalidate()
+        raise Exception("公費紀錄在重設過程中被修改，請稍後再試")
+
+    def _reset_group(self, group):
+        self._flush_pending()  # 先寫出尚未寫入的列，避免重設後才被補寫
+
+        group_sheet = get_worksheet(group)
+        from gspread.exceptions import WorksheetNotFound
+        try:
+            legacy_sheet = get_worksheet("group_records")  # 舊版共用的餐別紀錄分頁
+        except WorksheetNotFound:
+            legacy_sheet = None
+
+        # 以未格式化的值讀取，備份與復原後金額仍是數字
+        unformatted = {"value_render_option": "UNFORMATTED_VALUE"}
+        deleted = []  # [(分頁, [列號, ...], [列, ...]), ...]
+        meal_values = group_sheet.get("A2:J", **unformatted)
+        deleted.append((group_sheet, list(range(2, len(meal_values) + 2)), meal_values))
+
+        deleted.append(self._group_fund_rows(group, **unformatted))
+
+        if legacy_sheet is not None:
+            values = legacy_sheet.get_all_values(**unformatted)
+            if values and "group_name" in values[0]:
+                col = values[0].index("group_name")
+                legacy_rows = [(i, row) for i, row in enumerate(values[1:], start=2)
+                               if len(row) > col and row[col] == group]
+                deleted.append((legacy_sheet, [i for i, _ in legacy_rows], [row for _, row in legacy_rows]))
+
+        deleted = [(sheet, numbers, rows) for sheet, numbers, rows in deleted if numbers]
+        if not deleted:
+            return None
+
+        title, requests = backup_requests(group, [(sheet.title, rows) for sheet, _, rows in deleted])
+        for sheet, numbers, _ in deleted:
+            requests += [delete_rows_request(sheet.id, start, end) for start, end in reversed(row_spans(numbers))]
+        get_spreadsheet().batch_update({"requests": requests})
+        balance_index.invalidate()
+        meal_index.invalidate(group)
+        return {"sheets": title}
+
+    def delete_records(self, group, meal_rows, fund_rows):
+        """
+        鏡像用：刪除內容與指定列相同的餐別列與公費列，同樣內容的列各只刪一次，找不到的列略過。
+        以未格式化的值比對，與 SQLite 讀出的列一致
+        """
+        unformatted = {"value_render_option": "UNFORMATTED_VALUE"}
+        with _delete_lock:
+            self._flush_pending()
+            group_sheet = get_worksheet(group)
+            meal_values = group_sheet.get("A2:J", **unformatted)
+            meal_numbers = [i + 2 for i in matching_rows(meal_values, meal_rows)]
+            fund_sheet, numbers, values = self._group_fund_rows(group, **unformatted)
+            fund_numbers = [numbers[i] for i in matching_rows(values, fund_rows, fund_key)]
+            requests = [delete_rows_request(group_sheet.id, start, end)
+                        for start, end in reversed(row_spans(meal_numbers))]
+            requests += [delete_rows_request(fund_sheet.id, start, end)
+                         for start, end in reversed(row_spans(fund_numbers))]
+            if requests:
+                get_spreadsheet().batch_update({"requests": requests})
+                meal_index.invalidate(group)
+                balance_index.invalidate()
+
+def fund_key(row):
+    return row_checksum([normalize_group_name(row[0])] + list(row[1:])) if row else ""
+
+def matching_rows(values, targets, key=row_checksum):
+    """
+    values 中與 targets 內容相同的列的索引；targets 中每一列只對應一次
+    """
+    wanted = {}
+    for row in targets:
+        wanted[key(row)] = wanted.get(key(row), 0) + 1
+    found = []
+    for i, row in enumerate(values):
+        k = key(row)
+        if wanted.get(k):
+            wanted[k] -= 1
+            found.append(i)
+    return found
+
+_delete_lock = threading.Lock()  # 會讓列號位移的刪除與重設依序執行
+_backend = None
+
+# SQLite 模式的試算表鏡像由單一背景執行緒依序寫入，使用者的指令不等待試算表
+MIRROR_QUEUE_SIZE = int(os.getenv("MIRROR_QUEUE_SIZE", "10000"))
+_mirror_pool = None
+
+@sheets_call
+def _mirror_call(func, *args):
+    with priority(BACKGROUND):  # 鏡像不急，配額優先留給使用者指令
+        func(*args)
+
+def _submit_mirror(group, func, *args):
+    global _mirror_pool
+    with _cache_lock:
+        if _mirror_pool is None:
+            _mirror_pool = OrderedWorkerPool(workers=1, max_queue=MIRROR_QUEUE_SIZE)
+            atexit.register(_mirror_pool.shutdown)
+    _mirror_pool.submit(group, _mirror_call, func, *args)
+
+def get_backend():
+    global _backend
+    with _cache_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == "sqlite":
+                backend = SQLiteBackend(SQLITE_PATH, normalize_group_name, page_size=HISTORY_PAGE_SIZE,
+                                        backup_keep=RESET_BACKUP_KEEP)
+                if SHEETS_MIRROR:
+                    backend = MirroredBackend(backend, SheetsBackend(), _submit_mirror)
+            else:
+                backend = SheetsBackend()
+            _backend = backend
+        return _backend
+
+def _collect_metrics():
+    samples = [("linebot_sheets_cache_total", "counter", {"result": k}, v) for k, v in cache_stats.items()]
+    samples += [("linebot_sheets_quota_total", "counter", {"stat": k}, v) for k, v in quota.stats.items()]
+    if _journal is not None:
+        samples += [("linebot_journal_total", "counter", {"stat": k}, v) for k, v in _journal.stats.items()]
+        samples.append(("linebot_journal_pending_rows", "gauge", {}, len(_journal.pending_rows())))
+    if _mirror_pool is not None:
+        samples += [("linebot_mirror_queue", "gauge", {"stat": k}, v) for k, v in _mirror_pool.metrics().items()]
+    return samples
+
+metrics.register_collector(_collect_metrics)
+
+# 延遲寫入模式啟動時立即補寫上次未寫出的列
+if WRITE_BEHIND:
+    get_journal()
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# 工作的優先順序：使用者指令優先於背景工作（例如延遲寫入的補寫）
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_local = threading.local()
+
+
+def current_priority():
+    return getattr(_local, "priority", INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    在此區塊內送出的 Sheets 請求都以指定的優先順序排隊
+    """
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Sheets 配額是「每 window 秒 N 次」的滑動視窗：桶子容量 burst，每秒補充 (N - burst) / window 個 token，
+    任一 window 秒內最多送出 burst + (N - burst) = N 次請求。
+    背景工作只能使用超過 reserve 的 token，且有使用者指令在排隊時一律讓路。
+    """
+
+    def __init__(self, limit, window=60, burst=None, reserve=None):
+        self.burst = burst if burst is not None else max(1, limit // 6)
+        self.rate = max(limit - self.burst, 1) / window
+        self.reserve = reserve if reserve is not None else self.burst // 2
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, level=INTERACTIVE, timeout=None):
+        """
+        取得一個 token，回傳等待的秒數；超過 timeout 時拋出 QuotaExceeded
+        """
+        interactive = level == INTERACTIVE
+        start = time.monotonic()
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    floor = 1 if interactive else 1 + self.reserve
+                    if self._tokens >= floor and (interactive or not self._interactive_waiting):
+                        self._tokens -= 1
+                        return time.monotonic() - start
+                    wait = max((floor - self._tokens) / self.rate, 0.01)
+                    if timeout is not None:
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            raise QuotaExceeded("Sheets 配額等待逾時")
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def drain(self):
+        """
+        收到 429 時清空桶子，讓所有執行緒一起放慢，而不是只有被拒絕的那一個
+        """
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, 0)
+
+
+class QuotaLimiter:
+    """
+    讀取與寫入配額分開計算（Sheets API 對兩者各有每分鐘上限），
+    並以 install(session) 掛在 HTTP session 前面，所有 Sheets 請求都會先取得 token。
+    window 為配額的計算週期（秒），量測時可縮短以加快速度。
+    """
+
+    def __init__(self, read_per_minute=60, write_per_minute=60, max_retries=5,
+                 backoff_base=1.0, backoff_cap=32.0, timeout=None, window=60):
+        self.buckets = {
+            "read": TokenBucket(read_per_minute, window),
+            "write": TokenBucket(write_per_minute, window),
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds_total": 0.0, "retries": 0, "rejected": 0}
+
+    @staticmethod
+    def kind(method):
+        return "read" if method.upper() == "GET" else "write"
+
+    def acquire(self, kind):
+        waited = self.buckets[kind].acquire(current_priority(), self.timeout)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["wait_seconds_total"] += waited
+            if waited > 0.001:
+                self.stats["throttled"] += 1
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        full jitter 指數退避；伺服器有給 Retry-After 時以它為下限
+        """
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    def retryable(self, kind, status):
+        """
+        429 代表請求被拒絕、沒有被執行，讀寫都可以重試；
+        5xx 時寫入可能已經生效，只重試讀取，寫入交給 sheets_call 重新連線後拋出，避免重複寫入
+        """
+        return status == 429 or (status >= 500 and kind == "read")
+
+    def install(self, session):
+        """
+        包裝 requests.Session.request：送出前取得 token，429/5xx 時退避後重試
+        """
+        send = session.request
+
+        def request(method, url, *args, **kwargs):
+            kind = self.kind(method)
+            attempt = 0
+            while True:
+                self.acquire(kind)
+                response = send(method, url, *args, **kwargs)
+                if not self.retryable(kind, response.status_code):
+                    return response
+                if response.status_code == 429:
+                    self.buckets[kind].drain()
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.stats["rejected"] += 1
+                    return response
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(self.backoff(attempt, response.headers.get("Retry-After")))
+                attempt += 1
+
+        session.request = request
+        return session
@@ -0,0 +1,63 @@
+"""
+啟動時間檢查：以 python -X importtime 量測匯入 app 的時間，超過預算時以非 0 結束。
+用法：python startup_budget.py [預算毫秒]
+預算預設讀取環境變數 STARTUP_BUDGET_MS，未設定時為 DEFAULT_BUDGET_MS。
+"""
+import os
+import re
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 800
+MODULE = "app"
+
+# app 匯入時就建立 LineBotApi／WebhookHandler，未設定憑證的環境以假值量測
+DUMMY_ENV = {"LINE_CHANNEL_ACCESS_TOKEN": "startup-budget-token", "LINE_CHANNEL_SECRET": "startup-budget-secret"}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def measure_import(module=MODULE):
+    """
+    回傳 (總匯入時間毫秒, [(模組, 自身毫秒, 累計毫秒), ...])，清單依累計時間排序
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**DUMMY_ENV, **os.environ},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"匯入 {module} 失敗：\n{result.stderr[-2000:]}")
+
+    total_us = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us = int(match.group(1)), int(match.group(2))
+        name = match.group(4)
+        if len(match.group(3)) == 1:  # 只加總最外層，避免重複計算子模組
+            total_us += cumulative_us
+        modules.append((name, self_us / 1000, cumulative_us / 1000))
+    modules.sort(key=lambda m: m[2], reverse=True)
+    return total_us / 1000, modules
+
+
+def main(argv):
+    budget_ms = float(argv[1]) if len(argv) > 1 else float(os.getenv("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS))
+    total_ms, modules = measure_import()
+    print(f"匯入 {MODULE}：{total_ms:.1f} ms（預算 {budget_ms:.0f} ms）")
+    for name, self_ms, cumulative_ms in modules[:10]:
+        print(f"  {cumulative_ms:8.1f} ms  (self {self_ms:6.1f} ms)  {name}")
+    if total_ms > budget_ms:
+        print("❌ 超過啟動時間預算")
+        return 1
+    print("✅ 啟動時間在預算內")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
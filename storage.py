@@ -0,0 +1,397 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from meal_index import LEGACY_LINK_WINDOW, link_deductions, meal_adjustments, meal_record_id
+
+
+class LedgerBackend:
+    """
+    帳本儲存介面：團體、餐別紀錄與公費紀錄。
+    列的格式與試算表一致：
+    - 餐別列：[時間, 餐別, 金額, 付款人, 紀錄編號, 調整...]
+    - 公費列：[團名, 成員, 時間, 金額, 類型, [紀錄編號]]
+    團名一律以 normalize 後的名稱比對。
+    """
+
+    def load_groups(self):
+        """回傳 {正規化團名: [成員, ...]}"""
+        raise NotImplementedError
+
+    def add_group(self, group_name, members):
+        raise NotImplementedError
+
+    def append_records(self, group, meal_rows, fund_rows):
+        """餐別列與公費列一起成功或一起失敗"""
+        raise NotImplementedError
+
+    def fund_balances(self, group):
+        """回傳 {成員: 餘額}"""
+        raise NotImplementedError
+
+    def meal_history(self, group, last=None, page=None, start=None, end=None):
+        """回傳 (列, 符合筆數, 頁碼, 總頁數)"""
+        raise NotImplementedError
+
+    def fund_history(self, group, last=None, page=None, start=None, end=None):
+        """回傳 (列, 符合筆數, 頁碼, 總頁數)"""
+        raise NotImplementedError
+
+    def delete_meal(self, group, date_str, meal_name):
+        """
+        刪除該日期所有同名餐別與對應的公費扣款，回傳
+        {"meals": 刪除筆數, "refunds": {成員: 退還金額}, "unlinked": 無法對應扣款的餐別數}；
+        找不到餐別時回傳 None。SQLiteBackend 另外回傳實際刪除的 "meal_rows" 與 "fund_rows"，供鏡像使用
+        """
+        raise NotImplementedError
+
+    def delete_records(self, group, meal_rows, fund_rows):
+        """刪除內容與指定列相同的餐別列與公費列，讓鏡像刪除與 primary 完全相同的列"""
+        raise NotImplementedError
+
+    def iter_meal_rows(self, group, page_size=1000):
+        """依寫入順序分頁讀取該團體所有餐別列，每次產生一頁 [列, ...]"""
+        raise NotImplementedError
+
+    def iter_fund_rows(self, group, page_size=1000):
+        """依寫入順序分頁讀取該團體所有公費列，每次產生一頁 [列, ...]"""
+        raise NotImplementedError
+
+    def reset_group(self, group):
+        """清除該團體的紀錄，回傳備份位置的 dict；沒有紀錄時回傳 None"""
+        raise NotImplementedError
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_key TEXT PRIMARY KEY,
+    group_name TEXT NOT NULL,
+    members TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meal_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    meal TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    payer TEXT NOT NULL DEFAULT '',
+    adjustments TEXT NOT NULL DEFAULT '[]',
+    record_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_meal_group_time ON meal_records (group_name, timestamp);
+CREATE TABLE IF NOT EXISTS fund_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL,
+    member TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    record_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_fund_group_time ON fund_records (group_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_fund_group_member ON fund_records (group_name, member);
+CREATE INDEX IF NOT EXISTS idx_fund_group_record ON fund_records (group_name, record_id);
+CREATE TABLE IF NOT EXISTS reset_backups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backup TEXT NOT NULL,
+    group_name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backup_group ON reset_backups (group_name, backup);
+"""
+
+MEAL_COLUMNS = "timestamp, meal, amount, payer, adjustments, record_id"
+FUND_COLUMNS = "group_name, member, timestamp, amount, type, record_id"
+
+
+def meal_values(row):
+    """餐別列 → (timestamp, meal, amount, payer, adjustments, record_id)"""
+    return (row[0], row[1], row[2], row[3],
+            json.dumps(meal_adjustments(row), ensure_ascii=False), meal_record_id(row))
+
+
+def meal_row(values):
+    """(timestamp, meal, amount, payer, adjustments, record_id) → 餐別列，沒有紀錄編號與調整時不補空欄"""
+    adjustments = json.loads(values[4])
+    return list(values[:4]) + ([values[5]] + adjustments if values[5] or adjustments else [])
+
+
+def fund_row(values):
+    """(group_name, member, timestamp, amount, type, record_id) → 公費列，沒有紀錄編號時不補空欄"""
+    return list(values[:5]) + ([values[5]] if values[5] else [])
+
+
+def page_bounds(total, page_size, last=None, page=None):
+    """
+    回傳 (offset, limit, 頁碼, 總頁數)；第 1 頁為最新的一頁，offset 由最舊的一筆起算
+    """
+    if last:
+        return max(0, total - last), last, 1, 1
+    pages = max(1, -(-total // page_size))
+    page = min(max(page or 1, 1), pages)
+    stop = total - (page - 1) * page_size
+    begin = max(0, stop - page_size)
+    return begin, stop - begin, page, pages
+
+
+class SQLiteBackend(LedgerBackend):
+    """
+    本地 SQLite 帳本，毫秒級回應，不需要憑證或網路。
+    """
+
+    def __init__(self, path, normalize, page_size=20, backup_keep=3):
+        self.path = path
+        self._normalize = normalize
+        self.page_size = page_size
+        self.backup_keep = max(1, backup_keep)  # 每個團體保留的重設備份份數
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def load_groups(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT group_key, members FROM groups").fetchall()
+        return {key: json.loads(members) for key, members in rows}
+
+    def add_group(self, group_name, members):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO groups (group_key, group_name, members) VALUES (?, ?, ?)",
+                (self._normalize(group_name), group_name, json.dumps(list(members), ensure_ascii=False)),
+            )
+        return cursor.rowcount == 1
+
+    def append_records(self, group, meal_rows, fund_rows):
+        key = self._normalize(group)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO meal_records (group_name, {MEAL_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(key,) + meal_values(row) for row in meal_rows],
+            )
+            self._conn.executemany(
+                f"INSERT INTO fund_records ({FUND_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                [(self._normalize(row[0]), row[1], row[2], row[3], row[4], row[5] if len(row) > 5 else "")
+                 for row in fund_rows],
+            )
+
+    def fund_balances(self, group):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT member, SUM(CASE WHEN type = '儲值' THEN amount ELSE -amount END)"
+                " FROM fund_records WHERE group_name = ? GROUP BY member",
+                (self._normalize(group),),
+            ).fetchall()
+        return dict(rows)
+
+    def _history(self, table, columns, group, last, page, start, end):
+        where = "group_name = ?"
+        params = [self._normalize(group)]
+        if start:
+            where += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            where += " AND timestamp < ?"
+            params.append(end + "~")  # 含結束日整天
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+            offset, limit, page, pages = page_bounds(total, self.page_size, last, page)
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {table} WHERE {where}"
+                " ORDER BY timestamp, id LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [list(row) for row in rows], total, page, pages
+
+    def meal_history(self, group, last=None, page=None, start=None, end=None):
+        rows, total, page, pages = self._history("meal_records", MEAL_COLUMNS, group, last, page, start, end)
+        return [meal_row(row) for row in rows], total, page, pages
+
+    def fund_history(self, group, last=None, page=None, start=None, end=None):
+        rows, total, page, pages = self._history("fund_records", FUND_COLUMNS, group, last, page, start, end)
+        return [fund_row(row) for row in rows], total, page, pages
+
+    def delete_meal(self, group, date_str, meal_name):
+        """
+        餐別與扣款在同一個交易中刪除。有紀錄編號的扣款以編號查詢；
+        舊資料以時間比對，只需要讀取當天（前後各多一分鐘）的餐別與沒有編號的扣款
+        """
+        key = self._normalize(group)
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        window = (key, (day - LEGACY_LINK_WINDOW).strftime("%Y-%m-%d %H:%M"),
+                  (day + timedelta(days=1) + LEGACY_LINK_WINDOW).strftime("%Y-%m-%d %H:%M"))
+        with self._lock, self._conn:
+            nearby = self._conn.execute(
+                "SELECT id, timestamp, meal, payer, record_id FROM meal_records"
+                " WHERE group_name = ? AND timestamp >= ? AND timestamp < ?", window).fetchall()
+            targets = [row for row in nearby if row[2] == meal_name and row[1][:10] == date_str]
+            if not targets:
+                return None
+            meal_ids = [row[0] for row in targets]
+            record_ids = [row[4] for row in targets if row[4]]
+            fund_entries = self._conn.execute(
+                "SELECT id, timestamp, member, record_id FROM fund_records"
+                " WHERE group_name = ? AND type != '儲值'"
+                f" AND (record_id IN ({','.join('?' * len(record_ids))})"
+                " OR (record_id = '' AND timestamp >= ? AND timestamp < ?))",
+                [key] + record_ids + list(window[1:])).fetchall()
+            members = self._conn.execute(
+                "SELECT members FROM groups WHERE group_key = ?", (key,)).fetchone()
+            linked, unlinked = link_deductions(
+                [(record_id, timestamp, payer) for _, timestamp, _, payer, record_id in targets],
+                [(record_id, timestamp, payer) for row_id, timestamp, _, payer, record_id in nearby
+                 if row_id not in meal_ids],
+                fund_entries,
+                len(json.loads(members[0])) if members else 0,
+            )
+            fund_marks = ",".join("?" * len(linked))
+            fund_rows = [fund_row(row) for row in self._conn.execute(
+                f"SELECT {FUND_COLUMNS} FROM fund_records WHERE id IN ({fund_marks}) ORDER BY id", linked)]
+            refunds = {}
+            for row in fund_rows:
+                refunds[row[1]] = refunds.get(row[1], 0) + row[3]
+            self._conn.execute(f"DELETE FROM fund_records WHERE id IN ({fund_marks})", linked)
+            meal_marks = ",".join("?" * len(meal_ids))
+            meal_rows = [meal_row(row) for row in self._conn.execute(
+                f"SELECT {MEAL_COLUMNS} FROM meal_records WHERE id IN ({meal_marks}) ORDER BY id", meal_ids)]
+            self._conn.execute(f"DELETE FROM meal_records WHERE id IN ({meal_marks})", meal_ids)
+        return {"meals": len(meal_ids), "refunds": refunds, "unlinked": unlinked,
+                "meal_rows": meal_rows, "fund_rows": fund_rows}
+
+    def _iter_pages(self, table, columns, group, page_size):
+        """
+        以 id 做 keyset 分頁，每頁只查詢 page_size 筆，不論資料量多大都不會一次載入
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, {columns} FROM {table} WHERE group_name = ? AND id > ?"
+                    " ORDER BY id LIMIT ?",
+                    (self._normalize(group), last_id, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [list(row[1:]) for row in rows]
+
+    def iter_meal_rows(self, group, page_size=1000):
+        for rows in self._iter_pages("meal_records", MEAL_COLUMNS, group, page_size):
+            yield [meal_row(row) for row in rows]
+
+    def iter_fund_rows(self, group, page_size=1000):
+        for rows in self._iter_pages("fund_records", FUND_COLUMNS, group, page_size):
+            yield [fund_row(row) for row in rows]
+
+    def reset_group(self, group):
+        """
+        該團體的列先複製到 reset_backups 再刪除，在同一個交易中完成；只保留最近 backup_keep 份備份
+        """
+        key = self._normalize(group)
+        base = f"備份_{group}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        with self._lock, self._conn:
+            backup, n = base, 1
+            while self._conn.execute("SELECT 1 FROM reset_backups WHERE backup = ?", (backup,)).fetchone():
+                n += 1  # 同一秒內重設兩次
+                backup = f"{base}_{n}"
+            copied = 0
+            for source, columns in (("meal_records", MEAL_COLUMNS), ("fund_records", FUND_COLUMNS)):
+                copied += self._conn.execute(
+                    f"INSERT INTO reset_backups (backup, group_name, source, row)"
+                    f" SELECT ?, group_name, ?, json_array({columns}) FROM {source}"
+                    f" WHERE group_name = ? ORDER BY id",
+                    (backup, source, key),
+                ).rowcount
+            if not copied:
+                return None
+            self._conn.execute("DELETE FROM meal_records WHERE group_name = ?", (key,))
+            self._conn.execute("DELETE FROM fund_records WHERE group_name = ?", (key,))
+            self._conn.execute(
+                "DELETE FROM reset_backups WHERE group_name = ? AND backup NOT IN ("
+                " SELECT DISTINCT backup FROM reset_backups WHERE group_name = ?"
+                " ORDER BY backup DESC LIMIT ?)",
+                (key, key, self.backup_keep),
+            )
+        return {"sqlite": backup}
+
+    def restore_backup(self, backup):
+        """
+        把重設備份的列加回帳本並刪除該備份，回傳 {表格: 加回的列數}
+        """
+        restored = {}
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT source, group_name, row FROM reset_backups WHERE backup = ? ORDER BY id",
+                (backup,)).fetchall()
+            for source, key, row in rows:
+                values = json.loads(row)
+                if source == "meal_records":
+                    self._conn.execute(
+                        f"INSERT INTO meal_records (group_name, {MEAL_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [key] + values)
+                else:
+                    self._conn.execute(
+                        f"INSERT INTO fund_records ({FUND_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", values)
+                restored[source] = restored.get(source, 0) + 1
+            self._conn.execute("DELETE FROM reset_backups WHERE backup = ?", (backup,))
+        return restored
+
+
+class MirroredBackend(LedgerBackend):
+    """
+    以 primary 為準，寫入成功後再盡力同步到 mirror（例如 Google Sheets）。
+    同步交給 submit(團名, func, *args) 排入背景佇列，使用者的指令不等待 mirror 的網路請求與配額；
+    佇列需依送出順序執行同一個團體的工作，並負責記錄 mirror 的錯誤；mirror 失敗不影響使用者的指令。
+    刪除餐別時 mirror 刪除 primary 實際刪除的列，不自行重新比對扣款，兩邊不會刪到不同的列。
+    """
+
+    def __init__(self, primary, mirror, submit):
+        self.primary = primary
+        self.mirror = mirror
+        self._submit = submit
+
+    def _mirror(self, method, group, *args):
+        self._submit(group, getattr(self.mirror, method), group, *args)
+
+    def load_groups(self):
+        return self.primary.load_groups()
+
+    def add_group(self, group_name, members):
+        created = self.primary.add_group(group_name, members)
+        if created:
+            self._mirror("add_group", group_name, members)
+        return created
+
+    def append_records(self, group, meal_rows, fund_rows):
+        self.primary.append_records(group, meal_rows, fund_rows)
+        self._mirror("append_records", group, meal_rows, fund_rows)
+
+    def fund_balances(self, group):
+        return self.primary.fund_balances(group)
+
+    def meal_history(self, group, last=None, page=None, start=None, end=None):
+        return self.primary.meal_history(group, last, page, start, end)
+
+    def fund_history(self, group, last=None, page=None, start=None, end=None):
+        return self.primary.fund_history(group, last, page, start, end)
+
+    def delete_meal(self, group, date_str, meal_name):
+        result = self.primary.delete_meal(group, date_str, meal_name)
+        if result is not None:
+            self._mirror("delete_records", group, result["meal_rows"], result["fund_rows"])
+        return result
+
+    def iter_meal_rows(self, group, page_size=1000):
+        return self.primary.iter_meal_rows(group, page_size)
+
+    def iter_fund_rows(self, group, page_size=1000):
+        return self.primary.iter_fund_rows(group, page_size)
+
+    def reset_group(self, group):
+        backups = self.primary.reset_group(group)
+        if backups:
+            self._mirror("reset_group", group)
+        return backups
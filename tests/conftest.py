@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 假試算表預設不限流，客戶端的配額限流也放寬，測試不需要等待
+os.environ.setdefault("SHEETS_READ_PER_MINUTE", "1000000")
+os.environ.setdefault("SHEETS_WRITE_PER_MINUTE", "1000000")
+os.environ["STORAGE_BACKEND"] = "sheets"
+os.environ.pop("WRITE_BEHIND", None)
+
+import pytest
+
+
+@pytest.fixture
+def fake_sheets(monkeypatch):
+    """
+    換成記憶體中的假試算表（tests/support/fake_sheets.py），並清除 sheet_utils 的所有快取與索引
+    """
+    import sheet_utils
+    from tests.support.fake_sheets import FakeClient
+
+    fake_client = FakeClient()
+    spreadsheet = fake_client.spreadsheet
+    spreadsheet.seed("groups", [["group_name", "members"], ["g", "A,B,C"], ["h", "A,B"]])
+    spreadsheet.seed("group_funds", [["group_name", "member", "timestamp", "amount", "type"]])
+    spreadsheet.seed("g", [sheet_utils.MEAL_HEADER])
+    spreadsheet.seed("h", [sheet_utils.MEAL_HEADER])
+
+    monkeypatch.setattr(sheet_utils, "_backend", None)
+    monkeypatch.setattr(sheet_utils, "_group_index", {})
+    monkeypatch.setattr(sheet_utils, "_group_index_loaded_at", None)
+    sheet_utils.balance_index.invalidate()
+    sheet_utils.meal_index.invalidate()
+    sheet_utils.use_client(fake_client)
+    yield spreadsheet
+    sheet_utils.balance_index.invalidate()
+    sheet_utils.meal_index.invalidate()
+    sheet_utils.invalidate_worksheet_cache()
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """sheet_utils 的 datetime.now() 固定為 tests/support/frozen_time.py 的時間"""
+    import sheet_utils
+    from tests.support.frozen_time import FrozenDatetime
+
+    monkeypatch.setattr(sheet_utils, "datetime", FrozenDatetime)
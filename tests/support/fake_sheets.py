@@ -0,0 +1,340 @@
+"""
+離線用的假 Google Sheets 伺服器：以滑動視窗模擬讀取／寫入各自的每分鐘配額，
+超過配額回 429，並可加入固定延遲與隨機 5xx。
+假試算表也模擬分頁的格線列數：讀取超出格線的範圍回 400，append 只把格線擴充到最後寫入的列。
+FakeSession 介面與 requests.Session.request 相同，可直接交給 QuotaLimiter.install()。
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+
+
+class FakeSheetsServer:
+    def __init__(self, read_per_minute=60, write_per_minute=60, window=60.0,
+                 latency=0.0, error_rate=0.0, seed=1):
+        self.limits = {"read": read_per_minute, "write": write_per_minute}
+        self.window = window
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._history = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self.stats = {"read": 0, "write": 0, "429": 0, "5xx": 0}
+
+    def handle(self, method, url, body=b""):
+        """
+        回傳 (HTTP 狀態碼, 回應內容)
+        """
+        kind = "read" if method.upper() == "GET" else "write"
+        now = time.monotonic()
+        with self._lock:
+            history = self._history[kind]
+            while history and now - history[0] >= self.window:
+                history.popleft()
+            if len(history) >= self.limits[kind]:
+                self.stats["429"] += 1
+                return 429, b'{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}'
+            history.append(now)
+            failed = self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if failed:
+                self.stats["5xx"] += 1
+                return 503, b'{"error": {"code": 503, "status": "UNAVAILABLE"}}'
+            self.stats[kind] += 1
+        return 200, json.dumps({"url": url}).encode()
+
+
+class FakeRequest:
+    def __init__(self, method, url, body):
+        self.method = method
+        self.url = url
+        self.body = body
+
+
+class FakeResponse:
+    def __init__(self, status_code, content, request):
+        self.status_code = status_code
+        self.content = content
+        self.request = request
+        self.headers = {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    def __init__(self, server):
+        self.server = server
+        self.hooks = {"response": []}
+
+    def request(self, method, url, data=None, **kwargs):
+        payload = kwargs.get("json")
+        body = data if data is not None else (json.dumps(payload).encode() if payload is not None else b"")
+        status, content = self.server.handle(method, url, body)
+        response = FakeResponse(status, content, FakeRequest(method, url, body))
+        for hook in self.hooks["response"]:
+            hook(response)
+        return response
+
+
+# ==== gspread 介面的假試算表 ====
+# 只實作 sheet_utils 用到的方法；每個操作都經過 FakeSession 送到 FakeSheetsServer，
+# 因此配額、延遲、限流與指標計數都和正式環境走相同的路徑。
+
+try:  # 有安裝 gspread 時沿用它的例外類別，讓 sheet_utils 的錯誤處理走正式環境的路徑
+    from gspread.exceptions import APIError as _APIError, WorksheetNotFound as _WorksheetNotFound
+except ImportError:
+    _APIError = _WorksheetNotFound = Exception
+
+
+class FakeAPIError(_APIError):
+    def __init__(self, response):
+        Exception.__init__(self, f"{response.status_code}: {response.content.decode()}")
+        self.response = response
+
+
+class FakeWorksheetNotFound(_WorksheetNotFound):
+    pass
+
+
+class FakeAuth:
+    valid = True
+    expiry = None
+
+
+def column_number(letters):
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - ord("A") + 1
+    return number
+
+
+def parse_range(a1):
+    """
+    "A5:E6" → (5, 6, 1, 5)；只有單一儲存格時起訖相同，"A2:B" 這類沒有結束列的範圍結束列為 None
+    """
+    cells = []
+    for cell in a1.split("!")[-1].split(":"):
+        letters = cell.rstrip("0123456789")
+        digits = cell[len(letters):]
+        cells.append((int(digits) if digits else None, column_number(letters)))
+    (start_row, start_col), (end_row, end_col) = cells[0], cells[-1]
+    return start_row, end_row, start_col, end_col
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id, row_count=1000):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = []
+        self.row_count = row_count  # 格線列數，與 gspread 的 Worksheet.row_count 對應
+
+    def _call(self, method, action):
+        return self.spreadsheet.client.call(method, f"/sheets/{self.title}/{action}")
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, rows, **kwargs):
+        self._call("POST", "values:append")
+        with self.spreadsheet.lock:
+            start = len(self.rows) + 1
+            self.rows.extend([["" if v is None else str(v) for v in row] for row in rows])
+            end = len(self.rows)
+            self.row_count = max(self.row_count, end)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:J{end}", "updatedRows": len(rows)}}
+
+    def get_all_values(self, **kwargs):
+        self._call("GET", "values")
+        with self.spreadsheet.lock:
+            return [_render(row, kwargs) for row in self.rows]
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        if not values:
+            return []
+        header = values[0]
+        return [
+            {key: (int(value) if value.lstrip("-").isdigit() else value)
+             for key, value in zip(header, row + [""] * (len(header) - len(row)))}
+            for row in values[1:]
+        ]
+
+    def col_values(self, col):
+        self._call("GET", "values")
+        with self.spreadsheet.lock:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def _slice(self, a1):
+        start_row, end_row, start_col, end_col = parse_range(a1)
+        if start_row > self.row_count or (end_row or 0) > self.row_count:
+            raise FakeAPIError(FakeResponse(
+                400, f'{{"error": {{"code": 400, "message": "Range ({a1}) exceeds grid limits.'
+                     f' Max rows: {self.row_count}"}}}}'.encode(), FakeRequest("GET", a1, b"")))
+        return [row[start_col - 1:end_col] for row in self.rows[start_row - 1:end_row]]
+
+    def get(self, a1, **kwargs):
+        self._call("GET", "values")
+        with self.spreadsheet.lock:
+            return [_render(row, kwargs) for row in self._slice(a1)]
+
+    def batch_get(self, ranges, **kwargs):
+        self._call("GET", "values:batchGet")
+        with self.spreadsheet.lock:
+            return [[_render(row, kwargs) for row in self._slice(a1)] for a1 in ranges]
+
+    def delete_rows(self, start, end=None):
+        self._call("POST", "batchUpdate")
+        with self.spreadsheet.lock:
+            self._delete(start - 1, end or start)
+
+    def _delete(self, start_index, end_index):
+        """
+        刪除格線上的列（0-based，不含 end_index），格線列數一起減少
+        """
+        del self.rows[start_index:end_index]
+        self.row_count -= max(0, min(end_index, self.row_count) - start_index)
+
+    def clear(self):
+        self._call("POST", "values:clear")
+        with self.spreadsheet.lock:
+            self.rows = []
+
+
+def _render(row, options):
+    """
+    value_render_option 為 UNFORMATTED_VALUE 時，整數內容以數字回傳
+    """
+    if options.get("value_render_option") != "UNFORMATTED_VALUE":
+        return list(row)
+    return [int(v) if v.lstrip("-").isdigit() else v for v in row]
+
+
+def _cell_text(cell):
+    value = next(iter(cell.get("userEnteredValue", {"stringValue": ""}).values()))
+    return str(value)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.RLock()
+        self._sheets = {}
+        self._next_id = 1
+
+    def _new_sheet(self, title, row_count=1000):
+        sheet = FakeWorksheet(self, title, self._next_id, row_count)
+        self._next_id += 1
+        self._sheets[title] = sheet
+        return sheet
+
+    def seed(self, title, rows, row_count=None):
+        """
+        不經過伺服器直接建立分頁與初始資料，用於準備量測環境；格線列數預設為 1000 或資料列數
+        """
+        with self.lock:
+            sheet = self._sheets.get(title) or self._new_sheet(title)
+            sheet.rows = [[str(v) for v in row] for row in rows]
+            sheet.row_count = row_count or max(1000, len(rows))
+        return sheet
+
+    def worksheet(self, title):
+        self.client.call("GET", f"/sheets/{title}")
+        with self.lock:
+            if title not in self._sheets:
+                raise FakeWorksheetNotFound(title)
+            return self._sheets[title]
+
+    def worksheets(self):
+        self.client.call("GET", "/sheets")
+        with self.lock:
+            return list(self._sheets.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        self.client.call("POST", "/batchUpdate")
+        with self.lock:
+            return self._new_sheet(title, int(rows))
+
+    def _by_id(self, sheet_id):
+        return next(sheet for sheet in self._sheets.values() if sheet.id == sheet_id)
+
+    def batch_update(self, body):
+        """
+        支援 addSheet、appendCells、updateCells、deleteDimension、duplicateSheet、deleteSheet、updateSheetProperties；
+        與 Sheets API 相同，所有請求一起套用
+        """
+        self.client.call("POST", "/batchUpdate")
+        with self.lock:
+            for request in body["requests"]:
+                if "addSheet" in request:
+                    properties = request["addSheet"]["properties"]
+                    sheet = self._new_sheet(properties["title"],
+                                            properties.get("gridProperties", {}).get("rowCount", 1000))
+                    sheet.id = properties.get("sheetId", sheet.id)
+                elif "appendCells" in request:
+                    target = request["appendCells"]
+                    sheet = self._by_id(target["sheetId"])
+                    sheet.rows.extend([[_cell_text(cell) for cell in row["values"]] for row in target["rows"]])
+                    sheet.row_count = max(sheet.row_count, len(sheet.rows))
+                elif "updateCells" in request:
+                    target = request["updateCells"]
+                    sheet = self._by_id(target["start"]["sheetId"])
+                    for offset, row in enumerate(target["rows"]):
+                        row_index = target["start"]["rowIndex"] + offset
+                        while len(sheet.rows) <= row_index:
+                            sheet.rows.append([])
+                        cells = sheet.rows[row_index]
+                        for col, cell in enumerate(row.get("values", []), start=target["start"]["columnIndex"]):
+                            cells.extend([""] * (col + 1 - len(cells)))
+                            cells[col] = _cell_text(cell)
+                elif "deleteDimension" in request:
+                    target = request["deleteDimension"]["range"]
+                    self._by_id(target["sheetId"])._delete(target["startIndex"], target["endIndex"])
+                elif "duplicateSheet" in request:
+                    source = self._by_id(request["duplicateSheet"]["sourceSheetId"])
+                    copy = self._new_sheet(request["duplicateSheet"]["newSheetName"], source.row_count)
+                    copy.rows = [list(row) for row in source.rows]
+                elif "deleteSheet" in request:
+                    sheet = self._by_id(request["deleteSheet"]["sheetId"])
+                    del self._sheets[sheet.title]
+                elif "updateSheetProperties" in request:
+                    properties = request["updateSheetProperties"]["properties"]
+                    sheet = self._by_id(properties["sheetId"])
+                    del self._sheets[sheet.title]
+                    sheet.title = properties["title"]
+                    self._sheets[sheet.title] = sheet
+        return {"replies": [{} for _ in body["requests"]]}
+
+
+class FakeClient:
+    """
+    取代 gspread.Client：open_by_key 永遠回傳同一份記憶體中的試算表
+    """
+
+    def __init__(self, server=None):
+        self.server = server or FakeSheetsServer(read_per_minute=10 ** 9, write_per_minute=10 ** 9)
+        self.session = FakeSession(self.server)
+        self.auth = FakeAuth()
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def call(self, method, url):
+        response = self.session.request(method, url)
+        if not response.ok:
+            raise FakeAPIError(response)
+        return response
+
+    def open_by_key(self, key):
+        self.call("GET", f"/spreadsheets/{key}")
+        return self.spreadsheet
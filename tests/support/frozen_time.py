@@ -0,0 +1,12 @@
+"""
+固定 sheet_utils 寫入的時間，測試跨過午夜也不會找不到「今天」的餐別
+"""
+from datetime import datetime
+
+TODAY = "2026-10-17"
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 10, 17, 12, 30, 5, tzinfo=tz)
@@ -0,0 +1,53 @@
+from balance_index import BalanceIndex
+
+FUND_HEADER = ["group_name", "member", "timestamp", "amount", "type"]
+
+
+def fund_values():
+    return [
+        FUND_HEADER,
+        ["g", "A", "2026-10-17 12:00:00", "300", "儲值"],
+        ["g", "A", "2026-10-17 12:30:00", "100", "deduct", "s1"],
+        ["h", "B", "2026-10-17 12:30:00", "50", "deduct", "s2"],
+        ["g", "B", "2026-10-17 12:30:00", "100", "deduct", "s1"],
+        ["g", "A", "2026-10-17 18:00:00", "40", "deduct", "s3"],
+    ]
+
+
+def test_balance_remove_shifts_later_rows():
+    index = BalanceIndex()
+    values = fund_values()
+    index.rebuild(values)
+
+    index.remove({3: values[2], 5: values[4]})
+
+    assert index.balances("g") == {"A": 260, "B": 0}
+    assert index.rows("g") == [(2, "2026-10-17 12:00:00"), (4, "2026-10-17 18:00:00")]
+    assert index.rows("h") == [(3, "2026-10-17 12:30:00")]
+    assert index.deductions("g") == [(4, "2026-10-17 18:00:00", "A", "s3")]
+    assert index.last_row == 4
+    assert index.loaded
+
+
+def test_balance_remove_last_row_marks_rebuild():
+    index = BalanceIndex()
+    values = fund_values()
+    index.rebuild(values)
+
+    index.remove({6: values[5]})
+
+    assert not index.loaded
+    assert index.next_range(1) is None
+
+
+def test_balance_apply_after_remove_continues_from_new_last_row():
+    index = BalanceIndex()
+    values = fund_values()
+    index.rebuild(values)
+    index.remove({3: values[2]})
+
+    assert index.next_range(2) == (6, 7)
+    row = ["g", "C", "2026-10-17 19:00:00", "10", "deduct", "s4"]
+    index.apply([row], (6, 6))
+    assert index.verify([row + [""]])
+    assert index.rows("g")[-1] == (6, "2026-10-17 19:00:00")
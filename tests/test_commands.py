@@ -0,0 +1,17 @@
+from commands import command_name, order_key
+
+
+def test_order_key_takes_group_from_first_argument():
+    assert order_key("分帳 大阪 午餐 300") == "大阪"
+    assert order_key("分帳大阪 午餐 300") == "大阪"
+    assert order_key("查詢公費餘額  Osaka ") == "osaka"
+
+
+def test_order_key_without_group_is_none():
+    assert order_key("指令") is None
+    assert order_key("你好 大阪") is None
+
+
+def test_command_name_for_unknown_message():
+    assert command_name("分帳大阪 午餐 300") == "分帳"
+    assert command_name("你好") == "unknown"
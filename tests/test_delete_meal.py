@@ -0,0 +1,81 @@
+import pytest
+
+import sheet_utils
+from tests.support.frozen_time import TODAY
+
+pytestmark = pytest.mark.usefixtures("frozen_now")
+
+
+def fund_rows(spreadsheet):
+    return spreadsheet.worksheet("group_funds").rows[1:]
+
+
+def test_delete_split_refunds_and_shifts_indexes(fake_sheets):
+    sheet_utils.top_up_group_fund("g", 900)
+    sheet_utils.split_group_expense("g", "午餐", 300, ["A+30"])
+    sheet_utils.split_group_expense("h", "午餐", 100, [])
+    sheet_utils.split_group_expense("g", "晚餐", 90, [])
+
+    reply = sheet_utils.delete_group_meal("g", TODAY, "午餐")
+
+    assert "A +120、B +90、C +90" in reply
+    assert [row[1] for row in fake_sheets.worksheet("g").rows[1:]] == ["晚餐"]
+    assert [(row[0], row[3]) for row in fund_rows(fake_sheets)] == [
+        ("g", "300"), ("g", "300"), ("g", "300"), ("h", "50"), ("h", "50"), ("g", "30"), ("g", "30"), ("g", "30"),
+    ]
+    backend = sheet_utils.get_backend()
+    assert backend.fund_balances("g") == {"A": 270, "B": 270, "C": 270}
+
+    # 索引的列號已往前移，不需重建就能刪除後面的餐別
+    rebuilds = sheet_utils.balance_index.stats["rebuilds"]
+    assert "A +30、B +30、C +30" in sheet_utils.delete_group_meal("g", TODAY, "晚餐")
+    assert sheet_utils.balance_index.stats["rebuilds"] == rebuilds
+    assert backend.fund_balances("g") == {"A": 300, "B": 300, "C": 300}
+    assert backend.fund_balances("h") == {"A": -50, "B": -50}
+
+
+def test_delete_legacy_meal_with_partial_deductions_is_unlinked(fake_sheets):
+    fake_sheets.seed("g", [sheet_utils.MEAL_HEADER, ["2026-10-17 12:30", "午餐", "300", "系統"]])
+    fake_sheets.seed("group_funds", [
+        ["group_name", "member", "timestamp", "amount", "type"],
+        ["g", "A", "2026-10-17 12:29:59", "100", "deduct"],
+        ["g", "B", "2026-10-17 12:30:00", "100", "deduct"],
+    ])
+
+    reply = sheet_utils.delete_group_meal("g", "2026-10-17", "午餐")
+
+    assert "1 筆餐別無法確定對應的扣款" in reply
+    assert "已退還公費" not in reply
+    assert len(fund_rows(fake_sheets)) == 2
+    assert fake_sheets.worksheet("g").rows[1:] == []
+
+
+def test_delete_after_manual_edit_rebuilds_index(fake_sheets):
+    sheet_utils.split_group_expense("h", "午餐", 100, [])
+    sheet_utils.split_group_expense("h", "晚餐", 60, [])
+    sheet_utils.split_group_expense("h", "宵夜", 20, [])
+    sheet_utils.delete_group_meal("h", TODAY, "宵夜")  # 建立餐別索引
+    # 有人手動刪掉第一列餐別，索引的列號已過期
+    fake_sheets.worksheet("h")._delete(1, 2)
+
+    reply = sheet_utils.delete_group_meal("h", TODAY, "晚餐")
+
+    assert "A +30、B +30" in reply
+    assert fake_sheets.worksheet("h").rows[1:] == []
+
+
+def test_legacy_meal_sheet_gets_record_id_column(fake_sheets):
+    fake_sheets.seed("g", [
+        ["時間", "餐別", "金額", "付款人", "調整"],
+        ["2026-10-17 12:30", "午餐", "300", "系統", "A+30", "B-10"],
+        ["2026-10-17 13:00", "飲料", "90", "A"],
+    ])
+
+    sheet_utils.split_group_expense("g", "晚餐", 90, [])
+
+    rows = fake_sheets.worksheet("g").rows
+    assert rows[0] == sheet_utils.MEAL_HEADER
+    assert rows[1] == ["2026-10-17 12:30", "午餐", "300", "系統", "", "A+30", "B-10"]
+    assert rows[2] == ["2026-10-17 13:00", "飲料", "90", "A"]
+    assert rows[3][1] == "晚餐" and rows[3][4]
+    assert "A+30 B-10" in sheet_utils.get_group_records("g")
@@ -0,0 +1,75 @@
+import pytest
+
+import event_dedup
+from event_dedup import MemoryDedupStore, SQLiteDedupStore, WebhookDeduplicator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(event_dedup, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl, max_entries):
+        if request.param == "memory":
+            return MemoryDedupStore(ttl=ttl, max_entries=max_entries)
+        store = SQLiteDedupStore(str(tmp_path / "dedup.db"), ttl=ttl, max_entries=max_entries)
+        store.PURGE_EVERY = 1  # 每次寫入都清理，方便檢查筆數上限
+        return store
+    return make
+
+
+def test_duplicate_within_ttl_is_rejected(clock, make_store):
+    store = make_store(ttl=60, max_entries=100)
+
+    assert store.add("e1")
+    clock.now += 59
+    assert not store.add("e1")
+
+
+def test_key_is_accepted_again_after_ttl(clock, make_store):
+    store = make_store(ttl=60, max_entries=100)
+    store.add("e1")
+    store.add("e2")
+
+    clock.now += 60
+    assert store.add("e1")
+    assert not store.add("e1")
+    assert len(store) == 1  # e2 已過期並被清掉
+
+
+def test_max_entries_evicts_oldest(clock, make_store):
+    store = make_store(ttl=3600, max_entries=3)
+    for key in ("e1", "e2", "e3", "e4"):
+        assert store.add(key)
+        clock.now += 1
+
+    assert len(store) == 3
+    assert not store.add("e4")
+    assert store.add("e1")  # 最舊的已被淘汰，重送時無法再辨識
+
+
+def test_deduplicator_counts_suppressed_redeliveries():
+    dedup = WebhookDeduplicator(MemoryDedupStore())
+    first = {"webhookEventId": "w1", "replyToken": "r1", "deliveryContext": {"isRedelivery": False}}
+    again = {"webhookEventId": "w1", "replyToken": "r1", "deliveryContext": {"isRedelivery": True}}
+    legacy = {"replyToken": "r2"}
+
+    results = [dedup.is_duplicate(event) for event in (first, again, again, legacy, legacy, {})]
+
+    assert results == [False, True, True, False, True, False]
+    assert dedup.stats == {"checked": 6, "suppressed": 3, "redeliveries": 2}
@@ -0,0 +1,51 @@
+import threading
+
+import sheet_utils
+from ledger_journal import LedgerJournal
+from sheets_quota import BACKGROUND, INTERACTIVE, current_priority, priority
+
+
+def fund_row(member, record_id):
+    return ["g", member, "2026-10-17 12:00:00", 100, "儲值", record_id]
+
+
+def test_replay_skips_rows_written_before_a_crash(fake_sheets, tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    def write_then_crash(sheet_name, rows, replay=False):
+        sheet_utils._flush_journal_rows(sheet_name, rows, replay)
+        raise RuntimeError("worker 在刪除日誌前中斷")
+
+    crashed = LedgerJournal(path, write_then_crash)
+    crashed.append([("group_funds", [fund_row("A", "r1"), fund_row("B", "r1")])])
+    try:
+        crashed.flush()
+    except RuntimeError:
+        pass
+    crashed.append([("group_funds", [fund_row("C", "r2")])])
+
+    LedgerJournal(path, sheet_utils._flush_journal_rows).flush()
+
+    rows = fake_sheets.worksheet("group_funds").rows[1:]
+    assert [(row[1], row[5]) for row in rows] == [("A", "r1"), ("B", "r1"), ("C", "r2")]
+
+
+def test_background_thread_flushes_at_background_priority(tmp_path):
+    seen = []
+    flushed = threading.Event()
+
+    def record(sheet_name, rows, replay=False):
+        seen.append(current_priority())
+        flushed.set()
+
+    journal = LedgerJournal(str(tmp_path / "journal.db"), record, flush_interval=60,
+                            background=lambda: priority(BACKGROUND))
+    journal.append([("group_funds", [fund_row("A", "r1")])])
+    journal.flush()
+    assert seen == [INTERACTIVE]
+
+    journal.append([("group_funds", [fund_row("B", "r2")])])
+    journal.start()
+    assert flushed.wait(5)
+    journal.close()
+    assert seen[1] == BACKGROUND
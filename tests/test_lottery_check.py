@@ -0,0 +1,67 @@
+import pytest
+
+import lottery_check
+from commands import process_command
+from lottery_check import LotteryDraw
+
+
+@pytest.fixture
+def draw():
+    return LotteryDraw("113年05-06月", "12345678", "87654321", ["10203040", "55512345"], ["777"])
+
+
+def test_special_and_grand_need_every_digit(draw):
+    assert draw.check("12345678") == ("特別獎", 10000000)
+    assert draw.check("87654321") == ("特獎", 2000000)
+    assert draw.check("02345678") is None
+    assert draw.check("97654321") is None
+
+
+@pytest.mark.parametrize("number, prize", [
+    ("10203040", ("頭獎", 200000)),
+    ("90203040", ("二獎", 40000)),
+    ("99203040", ("三獎", 10000)),
+    ("99903040", ("四獎", 4000)),
+    ("99993040", ("五獎", 1000)),
+    ("99999040", ("六獎", 200)),
+    ("99999940", None),
+])
+def test_first_prize_suffix_lengths(draw, number, prize):
+    assert draw.check(number) == prize
+
+
+def test_additional_sixth(draw):
+    assert draw.check("11111777") == ("增開六獎", 200)
+    assert draw.check("11117770") is None
+
+
+@pytest.mark.parametrize("number, prize", [
+    ("AB-10203040", ("頭獎", 200000)),
+    ("ab10203040", ("頭獎", 200000)),
+    (" AB12345678 ", ("特別獎", 10000000)),
+    ("A-10203040", None),
+    ("AB1020304", None),
+    ("AB-102030400", None),
+])
+def test_invoice_formats(draw, number, prize):
+    assert draw.check(number) == prize
+
+
+def test_check_many_keeps_only_winners(draw):
+    winners = draw.check_many(["AB-10203040", "CD99999999", "EF11111777", "壞號碼"])
+
+    assert winners == {"AB-10203040": ("頭獎", 200000), "EF11111777": ("增開六獎", 200)}
+
+
+def test_prize_check_command(draw, monkeypatch):
+    monkeypatch.setattr(lottery_check, "_draws", {"11305": draw})
+
+    reply = process_command("u", "查詢中獎 11305 AB10203040 CD99999999")
+
+    assert "共 2 張" in reply
+    assert "AB10203040：頭獎 200000 元" in reply
+    assert "總獎金：200000 元" in reply
+
+
+def test_prize_check_with_only_a_period_replies_usage():
+    assert process_command("u", "查詢中獎 11305").startswith("❗請提供發票號碼")
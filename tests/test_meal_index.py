@@ -0,0 +1,105 @@
+from meal_index import SPLIT_PAYER, MealIndex, link_deductions
+
+
+# ==== MealIndex ====
+
+def meal_values():
+    return [
+        ["2026-10-17 12:30", "午餐", "300", SPLIT_PAYER, "s1"],
+        ["2026-10-17 13:00", "飲料", "90", "A"],
+        ["2026-10-17 18:00", "晚餐", "120", SPLIT_PAYER, "s3", "A+10"],
+        ["2026-10-18 12:00", "午餐", "200", SPLIT_PAYER],
+    ]
+
+
+def test_meal_remove_shifts_later_rows():
+    index = MealIndex()
+    index.load("g", meal_values())
+    version, rows = index.find("g", "2026-10-17", "午餐")
+    assert rows == [(2, "2026-10-17 12:30", "s1", SPLIT_PAYER)]
+
+    assert index.remove("g", version, {2})
+
+    assert index.find("g", "2026-10-17", "晚餐")[1] == [(3, "2026-10-17 18:00", "s3", SPLIT_PAYER)]
+    assert index.find("g", "2026-10-18", "午餐")[1] == [(4, "2026-10-18 12:00", "", SPLIT_PAYER)]
+    assert index.next_range("g", 1) == (5, 5)
+    assert index.others("g", exclude={3}) == [("", "2026-10-17 13:00", "A"), ("", "2026-10-18 12:00", SPLIT_PAYER)]
+
+
+def test_meal_remove_with_stale_version_drops_group():
+    index = MealIndex()
+    index.load("g", meal_values())
+    version, _ = index.find("g", "2026-10-17", "午餐")
+    index.apply("g", [["2026-10-18 19:00", "宵夜", "60", "A"]], (6, 6))
+
+    assert not index.remove("g", version, {2})
+    assert not index.loaded("g")
+
+
+def test_meal_apply_out_of_order_drops_group():
+    index = MealIndex()
+    index.load("g", meal_values())
+
+    index.apply("g", [["2026-10-18 19:00", "宵夜", "60", "A"]], (8, 8))
+
+    assert not index.loaded("g")
+
+
+# ==== link_deductions ====
+
+def test_link_by_record_id():
+    fund_entries = [(10, "2026-10-17 12:30:00", "A", "s1"), (11, "2026-10-17 12:30:00", "B", "s2"),
+                    (12, "2026-10-17 12:30:00", "B", "s1")]
+
+    linked, unlinked = link_deductions([("s1", "2026-10-17 12:30:00", SPLIT_PAYER)],
+                                       [("s2", "2026-10-17 12:30:00", SPLIT_PAYER)], fund_entries, 3)
+
+    assert (linked, unlinked) == ([10, 12], 0)
+
+
+def test_link_record_id_without_deductions_is_unlinked():
+    linked, unlinked = link_deductions([("s9", "2026-10-17 12:30:00", SPLIT_PAYER)], [], [], 2)
+
+    assert (linked, unlinked) == ([], 1)
+
+
+def test_link_legacy_meal_when_every_member_matches():
+    fund_entries = [(10, "2026-10-17 12:29:59", "A", ""), (11, "2026-10-17 12:30:00", "B", ""),
+                    (12, "2026-10-17 18:00:00", "A", "")]
+
+    linked, unlinked = link_deductions([("", "2026-10-17 12:30", SPLIT_PAYER)], [], fund_entries, 2)
+
+    assert (linked, unlinked) == ([10, 11], 0)
+
+
+def test_link_legacy_meal_with_missing_member_refunds_nothing():
+    fund_entries = [(10, "2026-10-17 12:29:59", "A", ""), (11, "2026-10-17 12:30:00", "B", "")]
+
+    linked, unlinked = link_deductions([("", "2026-10-17 12:30", SPLIT_PAYER)], [], fund_entries, 3)
+
+    assert (linked, unlinked) == ([], 1)
+
+
+def test_link_legacy_meal_with_duplicate_member_refunds_nothing():
+    fund_entries = [(10, "2026-10-17 12:30:00", "A", ""), (11, "2026-10-17 12:30:01", "A", "")]
+
+    linked, unlinked = link_deductions([("", "2026-10-17 12:30", SPLIT_PAYER)], [], fund_entries, 2)
+
+    assert (linked, unlinked) == ([], 1)
+
+
+def test_link_legacy_meals_sharing_a_window_refund_nothing():
+    fund_entries = [(10, "2026-10-17 12:30:59", "A", ""), (11, "2026-10-17 12:30:59", "B", "")]
+
+    linked, unlinked = link_deductions([("", "2026-10-17 12:30", SPLIT_PAYER)],
+                                       [("", "2026-10-17 12:31", SPLIT_PAYER)], fund_entries, 2)
+
+    assert (linked, unlinked) == ([], 1)
+
+
+def test_link_ignores_member_paid_meals():
+    fund_entries = [(10, "2026-10-17 12:30:00", "A", "")]
+
+    linked, unlinked = link_deductions([("", "2026-10-17 12:30", "A")], [], fund_entries, 1)
+
+    assert (linked, unlinked) == ([], 0)
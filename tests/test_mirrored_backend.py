@@ -0,0 +1,64 @@
+import sheet_utils
+from meal_index import SPLIT_PAYER
+from storage import MirroredBackend, SQLiteBackend
+
+
+def sheet_rows(spreadsheet, title):
+    return [[str(v) for v in row] for row in spreadsheet.worksheet(title).rows[1:]]
+
+
+def primary_rows(primary, group):
+    meals = [[str(v) for v in row] for rows in primary.iter_meal_rows(group) for row in rows]
+    funds = [[str(v) for v in row] for rows in primary.iter_fund_rows(group) for row in rows]
+    return meals, funds
+
+
+def mirrored(tmp_path):
+    queued = []
+    primary = SQLiteBackend(str(tmp_path / "ledger.db"), sheet_utils.normalize_group_name)
+    primary.add_group("g", ["A", "B", "C"])
+    backend = MirroredBackend(primary, sheet_utils.SheetsBackend(), lambda group, func, *args: queued.append((func, args)))
+    return backend, queued
+
+
+def run(queued):
+    while queued:
+        func, args = queued.pop(0)
+        func(*args)
+
+
+def test_writes_are_queued_not_sent_inline(fake_sheets, tmp_path):
+    backend, queued = mirrored(tmp_path)
+
+    backend.append_records("g", [["2026-10-17 12:30", "午餐", 90, "A"]], [["g", "A", "2026-10-17 12:00:00", 100, "儲值"]])
+
+    assert sheet_rows(fake_sheets, "g") == []
+    assert len(queued) == 1
+    run(queued)
+    assert sheet_rows(fake_sheets, "g") == [["2026-10-17 12:30", "午餐", "90", "A"]]
+
+
+def test_delete_mirrors_the_rows_primary_deleted(fake_sheets, tmp_path):
+    backend, queued = mirrored(tmp_path)
+    backend.append_records("g", [], [["g", m, "2026-10-17 09:00:00", 100, "儲值"] for m in "ABC"])
+    backend.append_records(
+        "g",
+        [["2026-10-17 12:30:05", "午餐", 30, SPLIT_PAYER, "s1"]],
+        [["g", m, "2026-10-17 12:30:05", 10, "deduct", "s1"] for m in "ABC"],
+    )
+    # 舊資料：只有兩位成員的扣款，primary 不退還
+    backend.append_records(
+        "g",
+        [["2026-10-17 18:00", "晚餐", 300, SPLIT_PAYER]],
+        [["g", "A", "2026-10-17 17:59:59", 100, "deduct"], ["g", "B", "2026-10-17 18:00:00", 100, "deduct"]],
+    )
+    run(queued)
+
+    assert backend.delete_meal("g", "2026-10-17", "午餐")["refunds"] == {"A": 10, "B": 10, "C": 10}
+    assert backend.delete_meal("g", "2026-10-17", "晚餐")["unlinked"] == 1
+    run(queued)
+
+    meals, funds = primary_rows(backend.primary, "g")
+    assert sheet_rows(fake_sheets, "g") == meals == []
+    assert sheet_rows(fake_sheets, "group_funds") == funds
+    assert len(funds) == 5
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from settlement import FUND_POOL, distribute, minimal_transfers, net_balances, settle
+
+
+# ==== distribute ====
+
+def test_distribute_gives_remainder_in_member_order():
+    shares = distribute(100, ["A", "B", "C"])
+
+    assert shares == {"A": 34, "B": 33, "C": 33}
+    assert sum(shares.values()) == 100
+
+
+def test_distribute_applies_adjustments_before_splitting():
+    shares = distribute(301, ["A", "B", "C"], {"A": 30, "C": -10})
+
+    assert shares == {"A": 124, "B": 94, "C": 83}
+    assert sum(shares.values()) == 301
+
+
+def test_distribute_sums_exactly_over_many_splits():
+    rng = random.Random(7)
+    for _ in range(200):
+        members = [f"m{i}" for i in range(rng.randint(1, 9))]
+        total = rng.randint(0, 10000)
+        assert sum(distribute(total, members).values()) == total
+
+
+# ==== net_balances ====
+
+def test_net_balances_credits_member_paid_meals_in_cents():
+    meal_rows = [
+        ["2026-10-17 12:30", "午餐", "300", "系統", "s1"],
+        ["2026-10-17 13:00", "飲料", "1,234.5", "A"],
+        ["2026-10-17 14:00", "點心", "90", " B "],
+        ["2026-10-17 15:00", "咖啡", "60", "A"],
+        ["2026-10-17 16:00", "公費", "50", FUND_POOL],
+        ["2026-10-17 17:00", "壞資料", "abc", "B"],
+        ["2026-10-17 18:00", "沒有付款人"],
+    ]
+
+    balances = net_balances({"A": -100, "B": "12.5"}, meal_rows, members=["A", "B", "C"])
+
+    assert balances == {"A": -10000 + 123450 + 6000, "B": 1250 + 9000, "C": 0}
+
+
+def test_net_balances_without_meals_skips_pandas():
+    assert net_balances({"A": 10}, members=["B"]) == {"B": 0, "A": 1000}
+
+
+# ==== minimal_transfers ====
+
+def test_minimal_transfers_settles_everyone_within_n_minus_one():
+    balances = {"A": 500, "B": -200, "C": -200, "D": -100, "E": 0}
+
+    transfers = minimal_transfers(balances)
+
+    assert len(transfers) == 3  # 4 個非零成員最多 3 筆
+    settled = dict(balances)
+    for debtor, creditor, amount in transfers:
+        assert amount > 0
+        settled[debtor] += amount
+        settled[creditor] -= amount
+    assert all(value == 0 for value in settled.values())
+
+
+def test_minimal_transfers_pairs_largest_debtor_with_largest_creditor():
+    assert minimal_transfers({"A": 300, "B": 100, "C": -300, "D": -100}) == [("C", "A", 300), ("D", "B", 100)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_settle_routes_leftover_through_fund_pool(seed):
+    rng = random.Random(seed)
+    fund = {f"m{i}": rng.randint(-500, 500) for i in range(6)}
+
+    balances, transfers = settle(fund)
+
+    net = dict(balances)
+    net[FUND_POOL] = -sum(balances.values())
+    parties = len([value for value in net.values() if value])
+    assert len(transfers) <= max(parties - 1, 0)
+    for debtor, creditor, amount in transfers:
+        net[debtor] += amount
+        net[creditor] -= amount
+    assert all(value == 0 for value in net.values())
@@ -0,0 +1,58 @@
+import pytest
+
+import sheet_utils
+
+pytestmark = pytest.mark.usefixtures("frozen_now")
+
+
+def fund_rows(spreadsheet):
+    return spreadsheet.worksheet("group_funds").rows[1:]
+
+
+def test_reset_after_manual_sort_only_deletes_group_rows(fake_sheets):
+    sheet_utils.top_up_group_fund("g", 300)
+    sheet_utils.top_up_group_fund("h", 200)
+    sheet_utils.get_backend().fund_balances("g")  # 建立餘額索引
+    # 有人手動調換兩列：列數與最後一列都沒變，索引的尾端檢查看不出來
+    funds = fake_sheets.worksheet("group_funds").rows
+    funds[3], funds[4] = funds[4], funds[3]
+
+    assert "已重設【g】" in sheet_utils.reset_group_records("g")
+
+    assert [(row[0], row[3]) for row in fund_rows(fake_sheets)] == [("h", "100"), ("h", "100")]
+
+
+def test_iter_fund_rows_reads_contiguous_pages(fake_sheets):
+    rows = [["group_name", "member", "timestamp", "amount", "type"]]
+    for i in range(50):
+        rows += [["g", "A", "2026-10-17 12:00:00", str(i), "儲值"], ["h", "A", "2026-10-17 12:00:00", "1", "儲值"]]
+    fake_sheets.seed("group_funds", rows)
+    backend = sheet_utils.get_backend()
+    backend.fund_balances("g")  # 建立餘額索引
+    server = fake_sheets.client.server
+    reads = server.stats["read"]
+
+    pages = list(backend.iter_fund_rows("g", page_size=30))
+
+    assert [row[3] for page in pages for row in page] == [str(i) for i in range(50)]
+    assert server.stats["read"] - reads == 1 + 4  # 尾端檢查 + 第 2～100 列分 4 頁
+
+
+def test_meal_history_reads_only_index_tail_and_selected_rows(fake_sheets):
+    for i in range(30):
+        sheet_utils.append_group_record("g", f"餐{i}", 10, "A", {})
+    backend = sheet_utils.get_backend()
+    backend.meal_history("g")  # 建立餐別索引
+    # 其他 worker 寫入的列：索引的尾端檢查會發現並重新讀取
+    fake_sheets.worksheet("g").rows.append(["2026-10-17 12:00", "外送", "50", "B", ""])
+    server = fake_sheets.client.server
+    reads = server.stats["read"]
+
+    rows, total, page, pages = backend.meal_history("g", page=2)
+
+    assert total == 31 and (page, pages) == (2, 2)
+    assert [row[1] for row in rows] == [f"餐{i}" for i in range(11)]
+    assert server.stats["read"] - reads == 3  # 尾端檢查 + 重新讀取前五欄 + 選到的列
+    reads = server.stats["read"]
+    backend.meal_history("g")
+    assert server.stats["read"] - reads == 2
@@ -0,0 +1,130 @@
+import pytest
+
+from meal_index import SPLIT_PAYER
+from storage import SQLiteBackend, page_bounds
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "ledger.db"), str.lower, page_size=3)
+    backend.add_group("G", ["A", "B", "C"])
+    return backend
+
+
+def add_split(backend, meal, timestamp, record_id, amounts):
+    backend.append_records(
+        "G",
+        [[timestamp, meal, sum(amounts.values()), SPLIT_PAYER, record_id]],
+        [["G", member, timestamp, amount, "deduct", record_id] for member, amount in amounts.items()],
+    )
+
+
+def summary(result):
+    return {key: result[key] for key in ("meals", "refunds", "unlinked")}
+
+
+# ==== 分頁 ====
+
+def test_page_bounds_counts_pages_from_newest():
+    assert page_bounds(7, 3) == (4, 3, 1, 3)
+    assert page_bounds(7, 3, page=3) == (0, 1, 3, 3)
+    assert page_bounds(7, 3, page=99) == (0, 1, 3, 3)
+    assert page_bounds(7, 3, last=5) == (2, 5, 1, 1)
+    assert page_bounds(0, 3) == (0, 0, 1, 1)
+
+
+def test_meal_history_pages(backend):
+    backend.append_records("G", [[f"2026-10-{day:02d} 12:00", f"餐{day}", day, "A"] for day in range(1, 8)], [])
+
+    rows, total, page, pages = backend.meal_history("G")
+    assert [row[1] for row in rows] == ["餐5", "餐6", "餐7"]
+    assert (total, page, pages) == (7, 1, 3)
+
+    rows, _, page, _ = backend.meal_history("G", page=3)
+    assert [row[1] for row in rows] == ["餐1"]
+    assert page == 3
+
+    rows, total, _, _ = backend.meal_history("G", start="2026-10-02", end="2026-10-03")
+    assert [row[1] for row in rows] == ["餐2", "餐3"]
+    assert total == 2
+
+    rows, _, _, _ = backend.meal_history("G", last=2)
+    assert [row[1] for row in rows] == ["餐6", "餐7"]
+
+
+def test_iter_pages_cover_every_row_once(backend):
+    backend.append_records("G", [[f"2026-10-17 12:{i:02d}", f"餐{i}", i, "A", "", "B+1"] for i in range(7)], [])
+    backend.append_records("other", [["2026-10-17 12:00", "別團", 1, "A"]], [])
+
+    pages = list(backend.iter_meal_rows("G", page_size=3))
+
+    assert [len(rows) for rows in pages] == [3, 3, 1]
+    assert [row[1] for rows in pages for row in rows] == [f"餐{i}" for i in range(7)]
+    assert pages[0][0] == ["2026-10-17 12:00", "餐0", 0, "A", "", "B+1"]
+
+
+def test_record_id_round_trips(backend):
+    add_split(backend, "午餐", "2026-10-17 12:30:05", "s1", {"A": 10, "B": 10})
+
+    assert backend.meal_history("G")[0] == [["2026-10-17 12:30:05", "午餐", 20, SPLIT_PAYER, "s1"]]
+    assert next(backend.iter_fund_rows("G"))[0] == ["g", "A", "2026-10-17 12:30:05", 10, "deduct", "s1"]
+
+
+# ==== 刪除 ====
+
+def test_delete_quick_splits_refunds_each(backend):
+    backend.append_records("G", [], [["G", member, "2026-10-17 09:00:00", 100, "儲值"] for member in "ABC"])
+    for i in range(5):
+        add_split(backend, f"餐{i}", "2026-10-17 12:30:05", f"s{i}", {"A": 10, "B": 20, "C": 30})
+
+    for i in range(5):
+        result = backend.delete_meal("G", "2026-10-17", f"餐{i}")
+        assert summary(result) == {"meals": 1, "refunds": {"A": 10, "B": 20, "C": 30}, "unlinked": 0}
+
+    assert backend.fund_balances("G") == {"A": 100, "B": 100, "C": 100}
+    assert backend.meal_history("G")[1] == 0
+
+
+def test_delete_legacy_meal_with_partial_deductions_is_unlinked(backend):
+    backend.append_records(
+        "G",
+        [["2026-10-17 12:30", "午餐", 300, SPLIT_PAYER]],
+        [["G", "A", "2026-10-17 12:29:59", 100, "deduct"], ["G", "B", "2026-10-17 12:30:00", 100, "deduct"]],
+    )
+
+    result = backend.delete_meal("G", "2026-10-17", "午餐")
+
+    assert summary(result) == {"meals": 1, "refunds": {}, "unlinked": 1}
+    assert result["meal_rows"] == [["2026-10-17 12:30", "午餐", 300, SPLIT_PAYER]]
+    assert result["fund_rows"] == []
+    assert backend.fund_balances("G") == {"A": -100, "B": -100}
+
+
+def test_delete_legacy_meal_across_midnight(backend):
+    backend.append_records(
+        "G",
+        [["2026-10-18 00:00", "宵夜", 30, SPLIT_PAYER]],
+        [["G", member, "2026-10-17 23:59:59", 10, "deduct"] for member in "ABC"],
+    )
+
+    result = backend.delete_meal("G", "2026-10-18", "宵夜")
+
+    assert summary(result) == {"meals": 1, "refunds": {"A": 10, "B": 10, "C": 10}, "unlinked": 0}
+
+
+def test_delete_missing_meal_returns_none(backend):
+    assert backend.delete_meal("G", "2026-10-17", "午餐") is None
+
+
+# ==== 重設 ====
+
+def test_reset_and_restore_keeps_record_ids(backend):
+    add_split(backend, "午餐", "2026-10-17 12:30:05", "s1", {"A": 10})
+
+    backup = backend.reset_group("G")["sqlite"]
+    assert backend.meal_history("G")[1] == 0
+
+    assert backend.restore_backup(backup) == {"meal_records": 1, "fund_records": 1}
+    assert backend.meal_history("G")[0] == [["2026-10-17 12:30:05", "午餐", 10, SPLIT_PAYER, "s1"]]
+    assert backend.delete_meal("G", "2026-10-17", "午餐")["refunds"] == {"A": 10}
+
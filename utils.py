@@ -1,4 +1,5 @@
 import datetime
+import re
 
 # 解析金額映射（例如：小明:40,100 小美:60）
 def parse_amount_mapping(mapping_str):
@@ -43,3 +44,52 @@ def format_invoice_items(invoice_items):
     for item in invoice_items:
         formatted_items.append(f"{item['name']}: {item['amount']}")
     return "\n".join(formatted_items)
+
+# 解析查詢紀錄的分頁與日期參數（例如：最近10 / 第2頁 / 2024-06-01 2024-06-05）
+def parse_history_options(args):
+    options = {"last": None, "page": None, "start": None, "end": None}
+    dates = []
+    for arg in args:
+        if re.fullmatch(r"最近\d+", arg):
+            options["last"] = int(arg[2:])
+        elif re.fullmatch(r"第\d+頁", arg):
+            options["page"] = int(arg[1:-1])
+        elif re.fullmatch(r"\d{4}[-/]\d{1,2}[-/]\d{1,2}", arg):
+            y, m, d = re.split(r"[-/]", arg)
+            dates.append(f"{y}-{int(m):02d}-{int(d):02d}")
+        else:
+            return None
+    if len(dates) > 2:
+        return None
+    if dates:
+        options["start"] = dates[0]
+        options["end"] = dates[-1]
+    return options
+
+# 將過長的回覆切成多則 LINE 訊息（每則上限 5000 字，每次回覆最多 5 則）
+LINE_MESSAGE_LIMIT = 5000
+LINE_MAX_MESSAGES = 5
+
+def split_message(text, limit=LINE_MESSAGE_LIMIT, max_messages=LINE_MAX_MESSAGES):
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current or not chunks:
+        chunks.append(current)
+    if len(chunks) > max_messages:
+        chunks = chunks[:max_messages]
+        notice = "\n…（內容過長，請使用分頁查詢）"
+        chunks[-1] = chunks[-1][:limit - len(notice)] + notice
+    return chunks
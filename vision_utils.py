@@ -1,65 +1,170 @@
-from google.cloud import vision
 import os
 import json
-import re
+import threading
+import metrics
+from invoice_parser import PARSER_VERSION, parse_invoice_text
+from ocr_cache import OCRCache
+
+# Vision API client 在所有執行緒間共用（gRPC client 本身是 thread-safe），
+# 避免每張圖片都重新建立連線與 TLS 交握
+_client = None
+_client_lock = threading.Lock()
+
+VISION_BATCH_LIMIT = 16  # batch_annotate_images 每次請求最多 16 張圖片
+
+# OCR 結果快取：同一張發票重複上傳或轉傳到其他群組時不再呼叫 Vision API
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", ".ocr_cache")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_MB", "50")) * 1024 * 1024
+
+_ocr_cache = None
 
-def extract_text_from_image(image_path):
-    """
-    使用 Google Vision API 擷取圖片中的文字
-    """
-    credentials_info = json.loads(os.environ.get("GOOGLE_CREDENTIALS"))
-    client = vision.ImageAnnotatorClient.from_service_account_info(credentials_info)
 
-    with open(image_path, "rb") as image_file:
-        content = image_file.read()
+def get_vision_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import vision  # 延遲載入，只有處理圖片的請求才需要
+                credentials_info = os.environ.get("GOOGLE_CREDENTIALS")
+                if credentials_info:
+                    _client = vision.ImageAnnotatorClient.from_service_account_info(
+                        json.loads(credentials_info))
+                else:
+                    _client = vision.ImageAnnotatorClient()
+    return _client
 
-    image = vision.Image(content=content)
-    response = client.text_detection(image=image)
 
-    texts = response.text_annotations
-    if not texts:
-        return ""
+def _collect_metrics():
+    if _ocr_cache is None:
+        return []
+    return [("linebot_ocr_cache_total", "counter", {"result": k}, v) for k, v in _ocr_cache.stats.items()]
 
-    return texts[0].description  # 回傳擷取到的整段文字
 
+metrics.register_collector(_collect_metrics)
 
-def extract_invoice_data_from_image(image_path):
+
+def get_ocr_cache():
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _client_lock:
+            if _ocr_cache is None:
+                _ocr_cache = OCRCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES)
+    return _ocr_cache
+
+
+def read_image_bytes(image):
     """
-    使用 Vision API 擷取發票品項、金額和發票號碼
+    接受 bytes、可讀取的檔案物件或檔案路徑，回傳圖片內容
     """
-    extracted_text = extract_text_from_image(image_path)
-    if not extracted_text:
-        return {"invoice_number": "", "total": 0, "items": []}
-
-    invoice_number_pattern = r'\b[A-Z]{2}\d{8}\b'  # 例如 AB12345678
-    amount_pattern = r'(\d+(?:,\d{3})*(?:\.\d{2})?)'
-    item_pattern = r'(\D+?)\s+(\d+(?:,\d{3})*(?:\.\d{2})?)'
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if hasattr(image, "read"):
+        return image.read()
+    with open(image, "rb") as image_file:
+        return image_file.read()
 
-    invoice_number_matches = re.findall(invoice_number_pattern, extracted_text)
-    invoice_number = invoice_number_matches[0] if invoice_number_matches else ""
 
-    amounts = re.findall(amount_pattern, extracted_text)
-    total = float(amounts[-1].replace(",", "")) if amounts else 0
+def _annotate_texts(contents):
+    """
+    以 batch_annotate_images 一次辨識多張圖片；辨識失敗的圖片回傳 None
+    """
+    from google.cloud import vision
+
+    client = get_vision_client()
+    feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+    texts = []
+    for start in range(0, len(contents), VISION_BATCH_LIMIT):
+        requests = [
+            vision.AnnotateImageRequest(image=vision.Image(content=content), features=[feature])
+            for content in contents[start:start + VISION_BATCH_LIMIT]
+        ]
+        batch_bytes = sum(len(content) for content in contents[start:start + VISION_BATCH_LIMIT])
+        with metrics.track("vision", "batch_annotate_images", bytes_out=batch_bytes):
+            response = client.batch_annotate_images(requests=requests)
+        for result in response.responses:
+            if result.error.message:
+                print("⚠️ Vision error:", result.error.message)
+                texts.append(None)
+            else:
+                texts.append(result.text_annotations[0].description if result.text_annotations else "")
+    return texts
+
+
+def extract_text_from_images(images):
+    """
+    一次辨識多張圖片，回傳每張圖片擷取到的整段文字。
+    已快取的圖片不會送到 Vision API。
+    """
+    cache = get_ocr_cache()
+    contents = [read_image_bytes(image) for image in images]
+    keys = [OCRCache.key(content) for content in contents]
+    texts = []
+    for key in keys:
+        entry = cache.get(key)
+        texts.append(entry["text"] if entry else None)
+
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if missing:
+        for i, text in zip(missing, _annotate_texts([contents[i] for i in missing])):
+            if text is not None:
+                cache.put(keys[i], {"text": text})
+            texts[i] = text or ""
+    return texts
+
+
+def extract_text_from_image(image):
+    """
+    使用 Google Vision API 擷取圖片中的文字，image 可為 bytes、檔案物件或路徑
+    """
+    return extract_text_from_images([image])[0]
 
-    items = []
-    item_matches = re.findall(item_pattern, extracted_text)
-    for match in item_matches:
-        item_name = match[0].strip()
-        item_amount = float(match[1].replace(",", ""))
-        items.append({"name": item_name, "amount": item_amount})
 
-    return {
-        "invoice_number": invoice_number,
-        "total": total,
-        "items": items
-    }
+def extract_invoice_data_from_image(image):
+    """
+    使用 Vision API 擷取發票品項、金額和發票號碼
+    """
+    return extract_invoice_data_from_images([image])[0]
 
 
-def extract_and_process_invoice(image_path):
+def extract_invoice_data_from_images(images):
+    """
+    一次辨識多張發票，回傳與 images 順序相同的解析結果。
+    快取中已有同版本解析結果的圖片連解析都會略過；只有 OCR 文字的則重新解析。
+    """
+    cache = get_ocr_cache()
+    contents = [read_image_bytes(image) for image in images]
+    keys = [OCRCache.key(content) for content in contents]
+    results = [None] * len(contents)
+    texts = [None] * len(contents)
+    for i, key in enumerate(keys):
+        entry = cache.get(key)
+        if entry is None:
+            continue
+        if entry.get("parser_version") == PARSER_VERSION:
+            cache.record_parsed_hit()
+            results[i] = entry["parsed"]
+        else:
+            texts[i] = entry["text"]
+
+    missing = [i for i, text in enumerate(texts) if text is None and results[i] is None]
+    if missing:
+        for i, text in zip(missing, _annotate_texts([contents[i] for i in missing])):
+            texts[i] = text
+
+    for i, text in enumerate(texts):
+        if results[i] is not None:
+            continue
+        results[i] = parse_invoice_text(text or "")
+        if text is not None:
+            cache.put(keys[i], {"text": text, "parser_version": PARSER_VERSION, "parsed": results[i]})
+    return results
+
+
+def extract_and_process_invoice(image):
     """
     提取發票並返回處理過的資料
     """
-    invoice_data = extract_invoice_data_from_image(image_path)
+    invoice_data = extract_invoice_data_from_image(image)
     if not invoice_data["invoice_number"]:
         return "❌ 無法識別發票號碼，請確認圖片清晰度。"
 